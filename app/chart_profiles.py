@@ -0,0 +1,47 @@
+from dataclasses import dataclass
+from os import getenv
+from typing import Any, Dict, Literal
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+@dataclass(frozen=True)
+class ChartProfile:
+    name: str
+    format: Literal['png', 'jpeg', 'webp'] = 'png'
+    dpi: int = 200
+    # 0-9, higher is smaller and slower (level 9 gives ~2% smaller charts for ~30% more time than 6)
+    png_compress_level: int = 6
+    # jpeg and webp
+    quality: int = 85
+    # size budget: dpi is lowered (at least by `dpi_step`) until image fits, but not below `min_dpi`
+    max_bytes: int | None = None
+    min_dpi: int = 72
+    dpi_step: int = 25
+
+    @property
+    def pil_kwargs(self) -> Dict[str, Any]:
+        if self.format == 'png':
+            return {'compress_level': self.png_compress_level}
+
+        return {'quality': self.quality}
+
+
+CHART_PROFILES: Dict[str, ChartProfile] = {
+    # as charts were always rendered
+    'default': ChartProfile('default'),
+    'compact': ChartProfile('compact', dpi=150, max_bytes=150 * 1024),
+    'jpeg': ChartProfile('jpeg', format='jpeg', dpi=150, quality=85, max_bytes=150 * 1024),
+    'webp': ChartProfile('webp', format='webp', dpi=150, quality=80, max_bytes=100 * 1024),
+}
+
+
+def get_chart_profile(name: str | None = None) -> ChartProfile:
+    name = name or getenv('CHART_PROFILE', 'default')
+
+    if name not in CHART_PROFILES:
+        raise ValueError(f'Unknown chart profile "{name}", available: {", ".join(CHART_PROFILES)}')
+
+    return CHART_PROFILES[name]
@@ -1,12 +1,25 @@
-import matplotlib.pyplot as plt
+from io import BytesIO
+from typing import Dict
+
+import matplotlib.style
 import numpy as np
 import pandas as pd
 import seaborn as sns
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 from matplotlib.font_manager import FontProperties
 
+from app.chart_profiles import CHART_PROFILES, ChartProfile
 from app.text_config import get_text
+from app.statistics import Statistic
+from app.rollups import is_summed_item
+
+# charts are built with Figure objects only, pyplot figures registry is never used.
+# Style is process-wide (rcParams), so it's applied once at import and only read while rendering
+matplotlib.style.use('classic')
+sns.set_theme(style="whitegrid")
 
-plt.style.use('classic')
+# rendered images are cached, bump CHARTS_TEMPLATE_VERSION (app/services/chart_service.py) on any change of charts look
 
 charts_config = {
     'cols': 2,
@@ -16,16 +29,38 @@ charts_config = {
 }
 
 
-def create_daily_report_charts(report_data: pd.DataFrame):
-    # Set a Seaborn style
-    sns.set_theme(style="whitegrid")
+def save_figure(fig: Figure, profile: ChartProfile, dpi: int) -> bytes:
+    buffer = BytesIO()
+    fig.savefig(buffer, format=profile.format, dpi=dpi, bbox_inches='tight', pil_kwargs=profile.pil_kwargs)
+
+    return buffer.getvalue()
+
+
+def create_chart_image(fig: Figure, profile: ChartProfile = CHART_PROFILES['default']) -> bytes:
+    FigureCanvasAgg(fig)
+
+    dpi = profile.dpi
+    image_data = save_figure(fig, profile, dpi)
+
+    # size budget: lower resolution until image fits.
+    # Charts are mostly flat areas and lines, their size grows about linearly with dpi,
+    # so next dpi is estimated from size ratio (at least `dpi_step` lower), usually it fits from the 2nd try
+    while profile.max_bytes is not None and len(image_data) > profile.max_bytes and dpi > profile.min_dpi:
+        estimated_dpi = int(dpi * profile.max_bytes / len(image_data))
+        dpi = max(min(estimated_dpi, dpi - profile.dpi_step), profile.min_dpi)
+        image_data = save_figure(fig, profile, dpi)
 
+    return image_data
+
+
+def create_daily_report_charts(report_data: pd.DataFrame) -> Figure:
     # Calculate number of rows needed
     n_cols = charts_config['cols']
     n_rows = (len(report_data) + n_cols - 1) // n_cols  # Ceiling division to get the number of rows
 
     # Create a figure with subplots
-    fig, axs = plt.subplots(n_rows, n_cols)
+    fig = Figure()
+    axs = fig.subplots(n_rows, n_cols)
     axs = axs.flatten()  # Flatten the array of axes for easy iteration
 
     # Define a color palette
@@ -122,7 +157,7 @@ def create_daily_report_charts(report_data: pd.DataFrame):
     y_anchor = 0.8
 
     for item_name, item_data in items_legend_data.items():
-        legend = plt.figlegend(
+        legend = fig.legend(
             [f'{label}: {value}' for label, value in zip(item_data['labels'], item_data['values'])],
             loc='center right',
             fontsize=charts_config['legend_field_font_size'],
@@ -135,39 +170,31 @@ def create_daily_report_charts(report_data: pd.DataFrame):
         y_anchor -= y_anchor_step
 
     # Adjust layout for better spacing and avoid overlap
-    plt.tight_layout(rect=(0, 0, 0.85, 1))  # Adjust the right margin to make space for the legend
+    fig.tight_layout(rect=(0, 0, 0.85, 1))  # Adjust the right margin to make space for the legend
 
-    return plt
+    return fig
 
 
-def create_week_report_charts():
-    # Sample data
-    data = {
-        'item': ['Сон', 'Їжа', 'Тренування', 'Читання', 'Робота'],
-        'goal': [8, 2000, 3, 30, 8],
-        'dates': [['20.09', '21.09', '22.09', '23.09', '24.09', '25.09', '26.09'],  # Dates for "Сон"
-                  ['20.09', '21.09', '22.09', '23.09', '24.09', '25.09', '26.09'],  # Dates for "Їжа"
-                  ['20.09', '21.09', '22.09', '23.09', '24.09', '25.09', '26.09'],  # Dates for "Тренування"
-                  ['20.09', '21.09', '22.09', '23.09', '24.09', '25.09', '26.09'],  # Dates for "Читання"
-                  ['20.09', '21.09', '22.09', '23.09', '24.09', '25.09', '26.09']],  # Dates for "Робота"
-        'results': [[7, 8, 9, 7, 6, 8, 7],  # Results for "Сон"
-                    [2100, 2000, 2200, 1900, 2000, 2100, 1800],  # Results for "Їжа"
-                    [1, 3, 2, 3, 2, 1, 3],  # Results for "Тренування"
-                    [20, 30, 25, 35, 30, 28, 32],  # Results for "Читання"
-                    [9, 8, 10, 7, 8, 6, 9]]  # Results for "Робота"
-    }
+# entry point for chart workers (app/services/chart_service.py)
+def render_daily_report_chart(
+    charts_data: Dict[str, list[int]],
+    profile: ChartProfile = CHART_PROFILES['default']
+) -> bytes:
+    return create_chart_image(create_daily_report_charts(pd.DataFrame(charts_data)), profile)
 
-    report_data = pd.DataFrame(data)
 
-    # Set a Seaborn style
-    sns.set_theme(style="whitegrid")
+def create_week_report_charts(statistic: Statistic) -> Figure:
+    results = statistic['results']
+    summary = statistic['summary']
+    dates = list(results.columns)
 
     # Calculate number of rows needed for subplots
     n_cols = 2
-    n_rows = (len(report_data) + n_cols - 1) // n_cols  # Ceiling division to get number of rows
+    n_rows = (len(summary) + n_cols - 1) // n_cols  # Ceiling division to get number of rows
 
     # Create a figure with subplots
-    fig, axs = plt.subplots(n_rows, n_cols, figsize=(10, 10))
+    fig = Figure(figsize=(10, 10))
+    axs = fig.subplots(n_rows, n_cols)
 
     axs = axs.flatten()  # Flatten the array of axes for easy iteration
 
@@ -178,11 +205,12 @@ def create_week_report_charts():
     items_legend_data = {}
 
     # Iterate over each item and create a bar chart
-    for ax, (index, row) in zip(axs, report_data.iterrows()):
-        item_name, goal_value, dates, results = row['item'], row['goal'], row['dates'], row['results']
+    for index, (ax, (item_key, item)) in enumerate(zip(axs, summary.iterrows())):
+        item_name, goal_value = item['title'], item['goal']
+        item_results = results.loc[item_key].to_numpy()
 
         # Create bar chart
-        ax.bar(dates, results, color=colors[index], label=get_text('charts-tracked-value'))
+        ax.bar(dates, item_results, color=colors[index % len(colors)], label=get_text('charts-tracked-value'))
 
         # Plot a horizontal line for the goal
         ax.axhline(goal_value, color='red', linestyle='--', label=get_text('charts-goal-value'), linewidth=2)
@@ -199,19 +227,19 @@ def create_week_report_charts():
         # Add legend
         ax.legend()
         # Collect data for the legend
-        if item_name == get_text('data-title-trainings-count'):
+        if is_summed_item(item_name):
             items_legend_data[item_name] = {
                 'labels': [get_text('charts-goal-value'), get_text('charts-sum-result')],
-                'values': [goal_value, sum(results)],
+                'values': [goal_value, item['sum']],
             }
         else:
             items_legend_data[item_name] = {
                 'labels': [get_text('charts-goal-value'), get_text('charts-average-result')],
-                'values': [goal_value, int(sum(results) / len(results))],
+                'values': [goal_value, item['mean']],
             }
 
     # Hide any empty subplots if there are fewer items than subplots
-    for i in range(len(report_data), len(axs)):
+    for i in range(len(summary), len(axs)):
         axs[i].axis('off')
 
     # Calculate figure height in inches
@@ -224,7 +252,7 @@ def create_week_report_charts():
     y_anchor = 0.8
 
     for item_name, item_data in items_legend_data.items():
-        legend = plt.figlegend(
+        legend = fig.legend(
             [f'{label}: {value}' for label, value in zip(item_data['labels'], item_data['values'])],
             loc='center right',
             fontsize=charts_config['legend_field_font_size'],
@@ -237,5 +265,11 @@ def create_week_report_charts():
         y_anchor -= y_anchor_step
 
     # Adjust layout for better spacing
-    plt.tight_layout(rect=(0, 0, 0.85, 1))  # Adjust the layout to fit everything nicely
-    plt.show()
+    fig.tight_layout(rect=(0, 0, 0.85, 1))  # Adjust the layout to fit everything nicely
+
+    return fig
+
+
+# entry point for chart workers (app/services/chart_service.py)
+def render_week_report_chart(statistic: Statistic, profile: ChartProfile = CHART_PROFILES['default']) -> bytes:
+    return create_chart_image(create_week_report_charts(statistic), profile)
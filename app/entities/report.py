@@ -12,10 +12,6 @@ class TrackedReportObject(BaseTrackedReportObject):
     goal_value: int
 
 
-class TempReportObject(BaseTrackedReportObject):
-    user_goal_field: str
-
-
 class ReportEntity:
     _report_fields: list[[str, TrackedReportObject]]
     _created_at: datetime
@@ -30,6 +26,14 @@ class ReportEntity:
     def append_field(self, field_name: str, field: TrackedReportObject):
         self._report_fields.append([field_name, field])
 
+    @property
+    def fields(self) -> list[[str, TrackedReportObject]]:
+        return self._report_fields
+
+    @property
+    def user_tg_id(self) -> int:
+        return self._user_tg_id
+
     @property
     def date(self) -> datetime | None:
         return self._created_at
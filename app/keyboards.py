@@ -1,4 +1,6 @@
 from typing import Dict
+from collections import OrderedDict
+from os import getenv
 import re
 
 import aiogram.utils.keyboard as keyboard
@@ -6,10 +8,45 @@ import aiogram.utils.keyboard as keyboard
 from app.entities.goal import GoalEntity, GoalChangeAccessType
 from app.text_config import get_text
 from app.types import TrainingGoalType
+from app.utils import get_goals_hash, get_next_custom_goal_key
 
 import app.types as app_types
 import app.callback_dates as cb_dates
 
+
+class KeyboardCache:
+    """LRU of built markups, keys should describe markup content completely."""
+
+    def __init__(self, max_size: int):
+        self._max_size = max_size
+        self._markups: OrderedDict[str, keyboard.InlineKeyboardMarkup] = OrderedDict()
+
+    def get(self, key: str) -> keyboard.InlineKeyboardMarkup | None:
+        markup = self._markups.get(key)
+
+        if markup is not None:
+            self._markups.move_to_end(key)
+
+        return markup
+
+    def set(self, key: str, markup: keyboard.InlineKeyboardMarkup) -> None:
+        self._markups[key] = markup
+        self._markups.move_to_end(key)
+
+        while len(self._markups) > self._max_size:
+            self._markups.popitem(last=False)
+
+    def invalidate(self, key: str) -> None:
+        self._markups.pop(key, None)
+
+    def clear(self) -> None:
+        self._markups.clear()
+
+
+goals_keyboards_cache = KeyboardCache(int(getenv('GOALS_KEYBOARDS_CACHE_SIZE', 5000)))
+training_types_keyboards_cache = KeyboardCache(len(TrainingGoalType))
+
+
 all_training_types_btns = {
     TrainingGoalType.trainings_per_week: get_text('btn-edit-training-type-goal-count-week'),
     TrainingGoalType.trainings_kcal: get_text('btn-edit-training-type-goal-kcal-training')
@@ -77,16 +114,34 @@ tracked_result_visualization_options_keyboard = keyboard.InlineKeyboardMarkup(in
 ])
 
 
+# constant markups, sent pre-serialized (see PreparedMarkupSession)
+STATIC_MARKUPS = (
+    first_step_keyboard,
+    main_keyboard,
+    statistic_keyboard,
+    training_goal_types_keyboard,
+    set_custom_goal_skip_keyboard,
+    set_custom_goal_complete_keyboard,
+    training_done_answer_keyboard,
+    tracked_result_visualization_options_keyboard,
+)
+
+
 def create_goals_keyboard(goals: Dict[str, GoalEntity.model]) -> keyboard.InlineKeyboardMarkup:
+    goals_hash = get_goals_hash(goals)
+    goals_markup = goals_keyboards_cache.get(goals_hash)
+
+    if goals_markup is None:
+        goals_markup = build_goals_keyboard(goals)
+        goals_keyboards_cache.set(goals_hash, goals_markup)
+
+    return goals_markup
+
+
+def build_goals_keyboard(goals: Dict[str, GoalEntity.model]) -> keyboard.InlineKeyboardMarkup:
     goals_keyboard = keyboard.InlineKeyboardBuilder()
     goals_items = goals.items()
-    last_goal_key = list(goals_items)[-1][0]
-
-    if 'customGoal' in last_goal_key:
-        last_custom_goal_index = int(last_goal_key[-1])
-        new_goal_key = f'customGoal_{last_custom_goal_index + 1}'
-    else:
-        new_goal_key = 'customGoal_1'
+    new_goal_key = get_next_custom_goal_key(goals)
 
     # add button for creating new goal
     goals_keyboard.add(keyboard.InlineKeyboardButton(
@@ -128,6 +183,16 @@ def create_goal_menu_keyboard(is_deletable: bool) -> keyboard.ReplyKeyboardMarku
 
 
 def create_available_training_types_keyboard(current_training_type: str) -> keyboard.InlineKeyboardMarkup:
+    training_types_markup = training_types_keyboards_cache.get(current_training_type)
+
+    if training_types_markup is None:
+        training_types_markup = build_available_training_types_keyboard(current_training_type)
+        training_types_keyboards_cache.set(current_training_type, training_types_markup)
+
+    return training_types_markup
+
+
+def build_available_training_types_keyboard(current_training_type: str) -> keyboard.InlineKeyboardMarkup:
     available_training_types_btns: list[tuple[TrainingGoalType, str]] = filter(
         lambda btn_dict: btn_dict[0].value != current_training_type,
         list(all_training_types_btns.items())
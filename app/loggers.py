@@ -21,3 +21,8 @@ def create_logger(
 
 error_logger = create_logger('Error log')
 db_logger = create_logger('Database log')
+chart_logger = create_logger('Chart log')
+webhook_logger = create_logger('Webhook log')
+reminder_logger = create_logger('Reminder log')
+send_logger = create_logger('Send log')
+profile_logger = create_logger('Profile log')
@@ -0,0 +1,149 @@
+"""
+Prometheus metrics of the bot, served on http://<host>:METRICS_PORT/metrics (empty METRICS_PORT disables the server).
+"""
+import functools
+import inspect
+from contextvars import ContextVar
+from os import getenv
+from typing import Any, Callable, Iterable, Protocol
+
+from dotenv import load_dotenv
+
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY, start_http_server
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.registry import Collector
+from pymongo import monitoring
+
+load_dotenv()
+
+METRICS_PORT = getenv('METRICS_PORT', '9100')
+
+# handlers answer in milliseconds, charts and Mongo under load - up to seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+HANDLER_LATENCY = Histogram(
+    'bot_handler_duration_seconds',
+    'Time spent in a handler, by router, handler and FSM state the update came in',
+    ['router', 'handler', 'state'],
+    buckets=LATENCY_BUCKETS,
+)
+HANDLER_ERRORS = Counter(
+    'bot_handler_errors_total',
+    'Handlers which raised an exception',
+    ['router', 'handler'],
+)
+MONGO_COMMAND_LATENCY = Histogram(
+    'bot_mongo_command_duration_seconds',
+    'Mongo command round trip, by command and DatabaseService method (database name for other clients)',
+    ['command', 'operation'],
+    buckets=LATENCY_BUCKETS,
+)
+MONGO_COMMAND_ERRORS = Counter(
+    'bot_mongo_command_errors_total',
+    'Failed Mongo commands',
+    ['command', 'operation'],
+)
+CHART_RENDERS = Counter(
+    'bot_chart_renders_total',
+    'Chart requests by result: cache_hit, shared (joined a render in progress), rendered, busy, timeout, error',
+    ['chart', 'result'],
+)
+CHART_RENDER_LATENCY = Histogram(
+    'bot_chart_render_duration_seconds',
+    'Time of chart render in a worker, including waiting for a free worker',
+    ['chart'],
+    buckets=LATENCY_BUCKETS,
+)
+CHART_SENDS = Counter(
+    'bot_chart_sends_total',
+    'Charts sent to users, by source: file_id (uploaded before) or upload',
+    ['source'],
+)
+DATABASE_READY = Gauge(
+    'bot_database_ready',
+    'Database readiness: 1 when connected and the last health check passed',
+)
+
+# DatabaseService method currently running, Mongo commands are labeled with it (see track_db_operations)
+db_operation: ContextVar[str | None] = ContextVar('db_operation', default=None)
+
+
+class CacheStats(Protocol):
+    hits: int
+    misses: int
+
+
+class CacheCollector(Collector):
+    # reads counters of a cache on scrape, so lookups aren't slowed down by metrics
+    def __init__(self, name: str, cache: CacheStats):
+        self._name = name
+        self._cache = cache
+
+    def collect(self) -> Iterable[CounterMetricFamily | GaugeMetricFamily]:
+        hits, misses = self._cache.hits, self._cache.misses
+
+        requests = CounterMetricFamily(f'bot_{self._name}_cache_requests', f'Lookups in {self._name} cache', labels=['result'])
+        requests.add_metric(['hit'], hits)
+        requests.add_metric(['miss'], misses)
+        yield requests
+
+        yield GaugeMetricFamily(
+            f'bot_{self._name}_cache_hit_ratio',
+            f'Share of {self._name} cache lookups served from cache since start',
+            value=hits / (hits + misses) if hits + misses else 0.0,
+        )
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """
+    Records latency of every Mongo command. Callbacks run in motor's executor threads
+    with context copied from the awaiting coroutine, so db_operation is visible here.
+
+    AsyncIOMotorClient(..., event_listeners=[MongoCommandListener()])
+    """
+
+    @staticmethod
+    def _get_labels(event: monitoring.CommandSucceededEvent | monitoring.CommandFailedEvent) -> tuple[str, str]:
+        return event.command_name, db_operation.get() or event.database_name
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        pass
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        MONGO_COMMAND_LATENCY.labels(*self._get_labels(event)).observe(event.duration_micros / 1e6)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        labels = self._get_labels(event)
+        MONGO_COMMAND_LATENCY.labels(*labels).observe(event.duration_micros / 1e6)
+        MONGO_COMMAND_ERRORS.labels(*labels).inc()
+
+
+def _with_db_operation(name: str, method: Callable[..., Any]) -> Callable[..., Any]:
+    @functools.wraps(method)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        token = db_operation.set(name)
+        try:
+            return await method(*args, **kwargs)
+        finally:
+            db_operation.reset(token)
+
+    return wrapper
+
+
+def track_db_operations(cls: type) -> type:
+    # class decorator: Mongo commands of public coroutine methods are labeled with method name
+    for name, method in list(vars(cls).items()):
+        if not name.startswith('_') and inspect.iscoroutinefunction(method):
+            setattr(cls, name, _with_db_operation(name, method))
+
+    return cls
+
+
+def register_cache_metrics(name: str, cache: CacheStats) -> None:
+    REGISTRY.register(CacheCollector(name, cache))
+
+
+def start_metrics_server() -> None:
+    # served from a daemon thread, scrapes don't compete with updates in the event loop
+    if METRICS_PORT:
+        start_http_server(int(METRICS_PORT))
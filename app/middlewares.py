@@ -0,0 +1,161 @@
+import time
+from copy import deepcopy
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import StateType
+from aiogram.types import TelegramObject
+
+from app.metrics import HANDLER_ERRORS, HANDLER_LATENCY
+from app.services.update_profiler import UpdateProfiler
+
+
+class BufferedFSMContext(FSMContext):
+    """
+    FSMContext which keeps all state/data changes of one update in memory,
+    storage is written once by flush() when the handler ends.
+    """
+
+    def __init__(self, context: FSMContext, raw_state: Optional[str]) -> None:
+        super().__init__(storage=context.storage, key=context.key)
+        self._state: StateType = raw_state
+        self._data: Dict[str, Any] | None = None
+        self._state_changed = False
+        self._data_changed = False
+
+    async def set_state(self, state: StateType = None) -> None:
+        self._state = state
+        self._state_changed = True
+
+    async def get_state(self) -> Optional[str]:
+        return self._state.state if isinstance(self._state, State) else self._state
+
+    async def set_data(self, data: Dict[str, Any]) -> None:
+        self._data = deepcopy(data)
+        self._data_changed = True
+
+    async def get_data(self) -> Dict[str, Any]:
+        # copy, handlers mutate received data and it shouldn't be written back implicitly
+        return deepcopy(await self._load_data())
+
+    async def update_data(self, data: Optional[Dict[str, Any]] = None, **kwargs: Any) -> Dict[str, Any]:
+        if data:
+            kwargs.update(data)
+
+        current_data = await self._load_data()
+        current_data.update(deepcopy(kwargs))
+        self._data_changed = True
+
+        return deepcopy(current_data)
+
+    async def clear(self) -> None:
+        await self.set_state(state=None)
+        await self.set_data({})
+
+    async def flush(self) -> None:
+        set_state_and_data = getattr(self.storage, 'set_state_and_data', None)
+
+        if self._state_changed and self._data_changed and set_state_and_data is not None:
+            await set_state_and_data(key=self.key, state=self._state, data=self._data)
+        else:
+            if self._state_changed:
+                await self.storage.set_state(key=self.key, state=self._state)
+            if self._data_changed:
+                await self.storage.set_data(key=self.key, data=self._data)
+
+        self._state_changed = False
+        self._data_changed = False
+
+    async def _load_data(self) -> Dict[str, Any]:
+        if self._data is None:
+            self._data = await self.storage.get_data(key=self.key)
+
+        return self._data
+
+
+class FSMWriteBackMiddleware(BaseMiddleware):
+    """
+    Collects update_data/set_state calls made while handling one update
+    and writes them to FSM storage at once.
+    Register as update outer middleware after Dispatcher creation, so it runs inside FSMContextMiddleware.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        context: FSMContext | None = data.get('state')
+
+        if context is None:
+            return await handler(event, data)
+
+        buffered_context = BufferedFSMContext(context, data.get('raw_state'))
+        data['state'] = buffered_context
+
+        try:
+            return await handler(event, data)
+        finally:
+            # changes made before a failure are kept, as with direct storage writes
+            await buffered_context.flush()
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Records handler latency by router, handler and FSM state (see app/metrics.py).
+    Register as inner middleware of dispatcher observers, so it applies to handlers of all routers
+    and times the handler only (filters and outer middlewares excluded).
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        callback = data['handler'].callback
+        # routers are module level objects, module name is their readable name
+        router = callback.__module__.rsplit('.', 1)[-1]
+        started_at = time.perf_counter()
+
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.labels(router, callback.__name__).inc()
+            raise
+        finally:
+            HANDLER_LATENCY.labels(router, callback.__name__, data.get('raw_state') or '').observe(
+                time.perf_counter() - started_at
+            )
+
+
+class UpdateProfilingMiddleware(BaseMiddleware):
+    """
+    Profiles sampled handler calls and reports slow ones with handler name and FSM state (see UpdateProfiler).
+    Register as inner middleware of dispatcher observers, as HandlerMetricsMiddleware.
+    """
+
+    def __init__(self, profiler: UpdateProfiler) -> None:
+        self._profiler = profiler
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        profile = self._profiler.start()
+        started_at = time.perf_counter()
+
+        try:
+            return await handler(event, data)
+        finally:
+            await self._profiler.finish(
+                profile,
+                data['handler'].callback.__name__,
+                data.get('raw_state'),
+                time.perf_counter() - started_at
+            )
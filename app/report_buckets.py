@@ -0,0 +1,114 @@
+"""
+Reports are stored in per-user monthly buckets (collection report_buckets), one document per user per month:
+
+{
+    'userTelegramID': 7,
+    'month': '2024-10',                       # local (Kyiv) month
+    'createdAt': [None, datetime, ...],       # time of report, index is day of month - 1
+    'items': {
+        'sleep': {'title': 'сон', 'color': 'yellow', 'tracked': [None, 7, ...], 'goal': [None, 8, ...]},
+        ...
+    },
+}
+
+Arrays are preallocated for MONTH_DAYS days, so a report updates values in place.
+Goal metadata (title, color) is kept once per bucket, the latest report wins.
+"""
+from datetime import date, datetime
+from typing import Any, Dict, Iterator, List, TypedDict
+
+import pytz
+from pymongo import UpdateOne
+
+from app.entities.report import ReportEntity
+
+kyiv_tz = pytz.timezone('Europe/Kyiv')
+
+MONTH_DAYS = 31
+
+
+class BucketItem(TypedDict):
+    key: str
+    title: str
+    color: str
+    tracked_value: int
+    goal_value: int
+
+
+def get_local_date(created_at: datetime) -> date:
+    # dates read without timezone codec options are naive UTC
+    if created_at.tzinfo is None:
+        created_at = pytz.utc.localize(created_at)
+
+    return created_at.astimezone(kyiv_tz).date()
+
+
+def get_bucket_month(day: date) -> str:
+    return day.strftime('%Y-%m')
+
+
+def get_report_items(report: ReportEntity) -> List[BucketItem]:
+    return [
+        {
+            'key': field_name,
+            'title': field['title'],
+            'color': field['color'],
+            'tracked_value': field['tracked_value'],
+            'goal_value': field['goal_value'],
+        }
+        for field_name, field in report.fields
+    ]
+
+
+def create_bucket_updates(user_tg_id: int, created_at: datetime, items: List[BucketItem]) -> List[UpdateOne]:
+    # must be written in order (ordered bulk_write), all updates are idempotent, so they can be retried
+    day = get_local_date(created_at)
+    bucket_filter = {'userTelegramID': user_tg_id, 'month': get_bucket_month(day)}
+    day_index = day.day - 1
+
+    updates = [
+        UpdateOne(bucket_filter, {'$setOnInsert': {'createdAt': [None] * MONTH_DAYS, 'items': {}}}, upsert=True),
+        # goals added during the month get their arrays on first report
+        *[
+            UpdateOne(
+                {**bucket_filter, f'items.{item['key']}': {'$exists': False}},
+                {'$set': {f'items.{item['key']}': {'tracked': [None] * MONTH_DAYS, 'goal': [None] * MONTH_DAYS}}}
+            )
+            for item in items
+        ],
+    ]
+
+    day_values: Dict[str, Any] = {f'createdAt.{day_index}': created_at}
+    for item in items:
+        day_values[f'items.{item['key']}.title'] = item['title']
+        day_values[f'items.{item['key']}.color'] = item['color']
+        day_values[f'items.{item['key']}.tracked.{day_index}'] = item['tracked_value']
+        day_values[f'items.{item['key']}.goal.{day_index}'] = item['goal_value']
+
+    updates.append(UpdateOne(bucket_filter, {'$set': day_values}))
+
+    return updates
+
+
+def get_bucket_charts_data(bucket: Dict[str, Any], day: date) -> Dict[str, list[int]] | None:
+    # same shape as ReportEntity.charts_data, items without value for the day (added later) are skipped
+    day_index = day.day - 1
+
+    if bucket['createdAt'][day_index] is None:
+        return None
+
+    items = [item for item in bucket['items'].values() if item['tracked'][day_index] is not None]
+
+    return {
+        'name': [item['title'] for item in items],
+        'tracked_value': [item['tracked'][day_index] for item in items],
+        'goal_value': [item['goal'][day_index] for item in items],
+    }
+
+
+def iterate_bucket_days(bucket: Dict[str, Any]) -> Iterator[date]:
+    year, month = map(int, bucket['month'].split('-'))
+
+    for day_index, created_at in enumerate(bucket['createdAt']):
+        if created_at is not None:
+            yield date(year, month, day_index + 1)
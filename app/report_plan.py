@@ -0,0 +1,52 @@
+from dataclasses import dataclass
+
+from app.entities.user import GoalsType
+from app.text_config import get_text
+from app.types import TrainingGoalType
+from app.utils import get_custom_goal_number, get_goals_hash, is_custom_goal_key
+
+# diet, training and sleep, custom goals follow them
+MAIN_STEPS_COUNT = 3
+
+TRAINING_TITLES = {
+    TrainingGoalType.trainings_per_week.value: get_text('data-title-trainings-count'),
+    TrainingGoalType.trainings_kcal.value: get_text('data-title-training-kcals'),
+}
+
+
+@dataclass(frozen=True)
+class ReportStep:
+    # report item key, e.g. 'sleep' or 'custom_3'
+    key: str
+    title: str
+    color: str
+    goal_value: int
+
+
+@dataclass(frozen=True)
+class ReportPlan:
+    """
+    Steps of day tracking compiled from user goals: TrackDayState handlers ask them one by one
+    and keep only tracked values in FSM state. Built once per goals version (see UserCache.get_report_plan).
+    """
+    # goals hash, a report started with other goals can't be completed with this plan
+    version: str
+    training_goal_type: str
+    steps: tuple[ReportStep, ...]
+
+
+def create_report_plan(goals: GoalsType) -> ReportPlan:
+    training_goal_type = goals['trainingGoalType']['goalValue']
+
+    steps = [
+        ReportStep('diet', 'їжа', 'red', goals['dietGoal']['goalValue']),
+        ReportStep('training', TRAINING_TITLES[training_goal_type], 'green', goals['trainingGoal']['goalValue']),
+        ReportStep('sleep', 'сон', 'yellow', goals['sleepGoal']['goalValue']),
+        *[
+            ReportStep(f'custom_{get_custom_goal_number(goal_key)}', goal['goalName'], 'blue', goal['goalValue'])
+            for goal_key, goal in goals.items()
+            if is_custom_goal_key(goal_key)
+        ],
+    ]
+
+    return ReportPlan(get_goals_hash(goals), training_goal_type, tuple(steps))
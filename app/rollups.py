@@ -0,0 +1,78 @@
+from datetime import date, timedelta
+from typing import TypedDict
+
+from pymongo import UpdateOne
+
+from app.entities.report import ReportEntity
+from app.text_config import get_text
+
+
+class DailyRollup(TypedDict):
+    userTelegramID: int
+    # local (Kyiv) date, YYYY-MM-DD
+    date: str
+    key: str
+    title: str
+    trackedValue: int
+    goalValue: int
+    met: bool
+
+
+def is_summed_item(title: str) -> bool:
+    # trainings per week goal is a total for the period, other goals are daily
+    return title == get_text('data-title-trainings-count')
+
+
+def is_goal_met(title: str, tracked_value: int, goal_value: int) -> bool:
+    if is_summed_item(title):
+        return tracked_value > 0
+
+    return tracked_value >= goal_value
+
+
+def create_rollup(user_tg_id: int, date_key: str, key: str, title: str, tracked_value: int, goal_value: int) -> DailyRollup:
+    return {
+        'userTelegramID': user_tg_id,
+        'date': date_key,
+        'key': key,
+        'title': title,
+        'trackedValue': tracked_value,
+        'goalValue': goal_value,
+        'met': is_goal_met(title, tracked_value, goal_value),
+    }
+
+
+def create_report_rollups(report: ReportEntity) -> list[DailyRollup]:
+    date_key = report.date.strftime('%Y-%m-%d')
+
+    return [
+        create_rollup(
+            report.user_tg_id,
+            date_key,
+            field_name,
+            field['title'],
+            field['tracked_value'],
+            field['goal_value']
+        )
+        for field_name, field in report.fields
+    ]
+
+
+def create_rollup_upsert(rollup: DailyRollup) -> UpdateOne:
+    return UpdateOne(
+        {'userTelegramID': rollup['userTelegramID'], 'date': rollup['date'], 'key': rollup['key']},
+        {'$set': rollup},
+        upsert=True
+    )
+
+
+def count_streak(met_dates: set[str], today: date) -> int:
+    # today without report doesn't break a streak, it can be tracked later in the evening
+    current_date = today if today.strftime('%Y-%m-%d') in met_dates else today - timedelta(days=1)
+    streak = 0
+
+    while current_date.strftime('%Y-%m-%d') in met_dates:
+        streak += 1
+        current_date -= timedelta(days=1)
+
+    return streak
@@ -0,0 +1,39 @@
+from os import getenv
+
+from dotenv import load_dotenv
+
+from aiogram import F, Router
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message
+
+from app.services.update_profiler import UpdateProfiler
+from app.text_config import get_text
+
+load_dotenv()
+
+# comma separated telegram IDs of bot maintainers
+ADMIN_IDS = {int(tg_id) for tg_id in getenv('ADMIN_IDS', '').split(',') if tg_id.strip()}
+
+admin_router = Router()
+admin_router.message.filter(F.from_user.id.in_(ADMIN_IDS))
+
+
+# /profile 0.05 - profile 5% of updates, /profile 0 - stop, /profile - current rate
+@admin_router.message(Command('profile'))
+async def profile_handler(message: Message, command: CommandObject, update_profiler: UpdateProfiler) -> None:
+    if command.args:
+        try:
+            sample_rate = float(command.args.strip())
+        except ValueError:
+            sample_rate = None
+
+        if sample_rate is None or not 0 <= sample_rate <= 1:
+            await message.answer(get_text('message-profile-usage'))
+            return
+
+        update_profiler.sample_rate = sample_rate
+
+    await message.answer(
+        f'{get_text('template-profile-sample-rate')} {update_profiler.sample_rate:g}, '
+        f'{get_text('template-profile-slow-seconds')} {update_profiler.slow_seconds:g}s'
+    )
@@ -1,54 +1,102 @@
-import pandas as pd
+import asyncio
+from typing import Dict
 
-from aiogram import Router, html
+from aiogram import Bot, Router, html
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.types import Message, CallbackQuery, BufferedInputFile
 from aiogram.fsm.context import FSMContext
 
 from app.services.db_service import DatabaseService
+from app.services.chart_service import ChartService, ChartServiceBusyError
+from app.services.user_cache import UserCache
+from app.metrics import CHART_SENDS
 from app.states import TrackDayState
 from app.filters import FilterGoalValue, FilterTextMessage
 from app.text_config import get_text
 from app.callback_dates import AnswerTrainingDoneCallbackData, TrackingResultOptionCallbackData
-from app.entities.user import UserDBModel
 from app.entities.report import ReportEntity
 from app.types import TrainingGoalType, ReportState
-from app.charts import create_daily_report_charts
-from app.utils import get_custom_goals, get_custom_goals_index_part_of_keys, process_report, create_chart_image
+from app.utils import process_report
+from app.report_plan import MAIN_STEPS_COUNT, ReportPlan
 
 import app.keyboards as k_boards
 
 daily_report_setting_router = Router()
 
 """
-During "report" flow I need to use some helper fields in state
-but in final stage, when I pass reported data to database I need to clear
-my state (state uses as database model) from these helper fields.
+Day tracking walks the user's report plan (app/report_plan.py): diet, training, sleep, then custom goals.
+FSM state keeps only tracked values in order of plan steps and the plan version they were tracked with
+(see ReportState in types.py), the report is built from them by process_report() (app/utils.py).
+"""
 
-I need to maintain state type with these helper fields in one place and don't forget
-about it when this flow will be changed.
-I decided to extract function for processing final result to app/utils - 'process_report()'
-and this function will use ReportState type.
 
-Note! Don't forget to add new helper fields to ReportState type (types.py) and
-also check TempReportObject inside app/entities/report.py
-"""
+async def add_tracked_value(
+    message: Message,
+    state: FSMContext,
+    user_cache: UserCache,
+    tracked_value: int
+) -> tuple[ReportPlan, list[int]] | None:
+    plan = await user_cache.get_report_plan(message.chat.id)
+    data: ReportState = await state.get_data()
+
+    # goals were changed after tracking started, values can't be matched to steps anymore
+    if plan is None or data.get('plan_version') != plan.version:
+        await state.clear()
+        await message.answer(get_text('message-track-goals-changed'), reply_markup=k_boards.main_keyboard)
+        return None
+
+    tracked_values = [*data['tracked_values'], tracked_value]
+    await state.update_data(tracked_values=tracked_values)
+
+    return plan, tracked_values
+
+
+async def ask_next_step(
+    message: Message,
+    state: FSMContext,
+    database: DatabaseService,
+    plan: ReportPlan,
+    tracked_values: list[int]
+) -> None:
+    next_step_index = len(tracked_values)
+
+    if next_step_index < MAIN_STEPS_COUNT:
+        await state.set_state(TrackDayState.sleep_score)
+        await message.answer(get_text('message-track-sleep'))
+    elif next_step_index < len(plan.steps):
+        await state.set_state(TrackDayState.custom_score)
+        await message.answer(f'{get_text('template-track-custom')} {plan.steps[next_step_index].title}')
+    else:
+        report = ReportEntity(message.chat.id)
+
+        # process result data
+        process_report(plan, tracked_values, report)
+
+        await database.create_report(report)
+
+        await state.update_data(charts_data=report.charts_data)
+        await state.set_state(TrackDayState.chart_visualization)
+        text = (
+            f'{get_text('message-track-successfully')}'
+            f'\n{html.bold(get_text('message-track-choose-result-view'))}'
+        )
+        await message.answer(text, reply_markup=k_boards.tracked_result_visualization_options_keyboard)
 
 
 # track diet report flow
 @daily_report_setting_router.message(TrackDayState.diet_score, FilterTextMessage(), FilterGoalValue())
-async def track_diet_report_value_handler(message: Message, state: FSMContext) -> None:
-    data = await state.get_data()
+async def track_diet_report_value_handler(message: Message, state: FSMContext, user_cache: UserCache) -> None:
+    plan = await user_cache.get_report_plan(message.chat.id)
 
-    user: UserDBModel = data['user']
+    # user was deleted or has no goals anymore
+    if plan is None:
+        await state.clear()
+        await message.answer(get_text('message-track-goals-changed'), reply_markup=k_boards.main_keyboard)
+        return
 
-    await state.update_data({'diet': {
-        'title': 'їжа',
-        'tracked_value': int(message.text),
-        'color': 'red',
-        'user_goal_field': 'dietGoal',
-    }})
+    await state.update_data(plan_version=plan.version, tracked_values=[int(message.text)])
 
-    match user['goals']['trainingGoalType']['goalValue']:
+    match plan.training_goal_type:
         case TrainingGoalType.trainings_per_week.value:
             text = f'{get_text('message-track-training')} {get_text('message-track-training-option-1')}'
             await state.set_state(TrackDayState.training_score_is_done)
@@ -67,32 +115,28 @@ async def track_diet_report_value_handler(message: Message, state: FSMContext) -
 async def track_is_training_done_report_value_handler(
     callback: CallbackQuery,
     callback_data: AnswerTrainingDoneCallbackData,
-    state: FSMContext
+    state: FSMContext,
+    database: DatabaseService,
+    user_cache: UserCache
 ) -> None:
-    await state.update_data({'training': {
-        'title': get_text('data-title-trainings-count'),
-        'tracked_value': 1 if callback_data.answer else 0,
-        'color': 'green',
-        'user_goal_field': 'trainingGoal',
-    }})
-
-    await state.set_state(TrackDayState.sleep_score)
     await callback.answer()
     await callback.message.edit_reply_markup(reply_markup=None)
-    await callback.message.answer(get_text('message-track-sleep'))
 
+    tracked = await add_tracked_value(callback.message, state, user_cache, 1 if callback_data.answer else 0)
+    if tracked is not None:
+        await ask_next_step(callback.message, state, database, *tracked)
 
-@daily_report_setting_router.message(TrackDayState.training_score_kcal, FilterTextMessage(), FilterGoalValue())
-async def track_training_kcal_report_value_handler(message: Message, state: FSMContext) -> None:
-    await state.update_data({'training': {
-        'title': get_text('data-title-training-kcals'),
-        'tracked_value': int(message.text),
-        'color': 'green',
-        'user_goal_field': 'trainingGoal',
-    }})
 
-    await state.set_state(TrackDayState.sleep_score)
-    await message.answer(get_text('message-track-sleep'))
+@daily_report_setting_router.message(TrackDayState.training_score_kcal, FilterTextMessage(), FilterGoalValue())
+async def track_training_kcal_report_value_handler(
+    message: Message,
+    state: FSMContext,
+    database: DatabaseService,
+    user_cache: UserCache
+) -> None:
+    tracked = await add_tracked_value(message, state, user_cache, int(message.text))
+    if tracked is not None:
+        await ask_next_step(message, state, database, *tracked)
 
 
 # track sleep report flow
@@ -100,45 +144,12 @@ async def track_training_kcal_report_value_handler(message: Message, state: FSMC
 async def track_sleep_report_value_handler(
     message: Message,
     state: FSMContext,
-    database: DatabaseService
+    database: DatabaseService,
+    user_cache: UserCache
 ) -> None:
-    await state.update_data({'sleep': {
-        'title': 'сон',
-        'tracked_value': int(message.text),
-        'color': 'yellow',
-        'user_goal_field': 'sleepGoal',
-    }})
-    data: ReportState = await state.get_data()
-
-    user: UserDBModel = data['user']
-
-    custom_goals = get_custom_goals(user['goals'])
-    custom_goals_indexes = get_custom_goals_index_part_of_keys(custom_goals)
-
-    if len(custom_goals) == 0:
-        report: ReportEntity = ReportEntity(user['telegramID'])
-
-        # process result data
-        process_report(data, user, report)
-
-        await database.create_report(report)
-
-        await state.update_data(charts_data=report.charts_data)
-        await state.set_state(TrackDayState.chart_visualization)
-        text = (
-            f'{get_text('message-track-successfully')}'
-            f'\n{html.bold(get_text('message-track-choose-result-view'))}'
-        )
-        await message.answer(text, reply_markup=k_boards.tracked_result_visualization_options_keyboard)
-    else:
-        await state.set_state(TrackDayState.custom_score)
-        await state.update_data(current_goal_index=0)
-        await state.update_data(custom_goals=custom_goals)
-        await state.update_data(custom_goals_indexes=custom_goals_indexes)
-        await state.update_data(custom_reported_goals={})
-        goal_key = custom_goals_indexes[0]
-        text = f'{get_text('template-track-custom')} {custom_goals[f'customGoal_{goal_key}']['goalName']}'
-        await message.answer(text)
+    tracked = await add_tracked_value(message, state, user_cache, int(message.text))
+    if tracked is not None:
+        await ask_next_step(message, state, database, *tracked)
 
 
 # track custom report flow
@@ -146,55 +157,43 @@ async def track_sleep_report_value_handler(
 async def track_custom_report_value_handler(
         message: Message,
         state: FSMContext,
-        database: DatabaseService
+        database: DatabaseService,
+        user_cache: UserCache
 ) -> None:
-    data: ReportState = await state.get_data()
-
-    custom_goals_indexes = data['custom_goals_indexes']
-    current_goal_index = data['current_goal_index']
-    current_goal_index_key_part = custom_goals_indexes[current_goal_index]
-    current_goal_key = f'customGoal_{current_goal_index_key_part}'
-    custom_reported_goals = data['custom_reported_goals']
-
-    # set new custom report
-    custom_reported_goals[f'custom_{current_goal_index_key_part}'] = {
-        'title': data['custom_goals'][current_goal_key]['goalName'],
-        'tracked_value': int(message.text),
-        'color': 'blue',
-        'user_goal_field': current_goal_key,
-    }
+    tracked = await add_tracked_value(message, state, user_cache, int(message.text))
+    if tracked is not None:
+        await ask_next_step(message, state, database, *tracked)
 
-    await state.update_data({'custom_reported_goals': custom_reported_goals})
 
-    # index starts from 0, there we start from 1
-    if current_goal_index + 1 == len(custom_goals_indexes):
-        # retrieve fresh data
-        data = await state.get_data()
-
-        # get user for future using
-        user: UserDBModel = data['user']
-        report = ReportEntity(user['telegramID'])
-
-        # process result data
-        process_report(data, user, report)
-
-        await database.create_report(report)
+async def send_daily_report_chart(
+    bot: Bot,
+    chat_id: int,
+    charts_data: Dict[str, list[int]],
+    chart_service: ChartService,
+    database: DatabaseService
+) -> None:
+    chart_key = chart_service.get_daily_report_key(charts_data)
+    file_id = await database.get_chart_file_id(chart_key)
+
+    # the same chart was sent before: telegram file is reused, nothing is rendered or uploaded
+    if file_id is not None:
+        try:
+            await bot.send_photo(chat_id, file_id, reply_markup=k_boards.main_keyboard)
+            CHART_SENDS.labels('file_id').inc()
+            return
+        except TelegramBadRequest:
+            # file_id isn't valid anymore (e.g. bot token was changed), upload the chart again
+            await database.delete_chart_file_id(chart_key)
+
+    # create png image from chart (renders outside of event loop)
+    image_data = await chart_service.render_daily_report(charts_data)
 
-        await state.update_data(charts_data=report.charts_data)
-        await state.set_state(TrackDayState.chart_visualization)
-        text = (
-            f'{get_text('message-track-successfully')}'
-            f'\n{html.bold(get_text('message-track-choose-result-view'))}'
-        )
-        await message.answer(text, reply_markup=k_boards.tracked_result_visualization_options_keyboard)
-    else:
-        next_goal_index = current_goal_index + 1
-        await state.update_data(current_goal_index=next_goal_index)
+    # create aiogram expeced InputFile
+    input_file = BufferedInputFile(image_data, 'report_bar_chart')
 
-        next_goal_index_key_part = custom_goals_indexes[next_goal_index]
-        next_goal_key = f'customGoal_{next_goal_index_key_part}'
-        text = f'{get_text('template-track-custom')} {data['custom_goals'][next_goal_key]['goalName']}'
-        await message.answer(text)
+    sent_message = await bot.send_photo(chat_id, input_file, reply_markup=k_boards.main_keyboard)
+    CHART_SENDS.labels('upload').inc()
+    await database.save_chart_file_id(chart_key, sent_message.photo[-1].file_id)
 
 
 @daily_report_setting_router.callback_query(
@@ -205,24 +204,27 @@ async def chart_visualization_handler(
     callback: CallbackQuery,
     callback_data: TrackingResultOptionCallbackData,
     state: FSMContext,
+    chart_service: ChartService,
+    database: DatabaseService
 ) -> None:
-    # get user and report
+    # charts data is taken from state, not from report buckets: the report can still be in the write buffer
     data: ReportState = await state.get_data()
-    user: UserDBModel = data['user']
+
+    try:
+        await send_daily_report_chart(
+            callback.message.bot,
+            callback.message.chat.id,
+            data['charts_data'],
+            chart_service,
+            database
+        )
+    except (ChartServiceBusyError, asyncio.TimeoutError):
+        # keep state, so user can press the button again
+        await callback.answer(get_text('message-charts-busy'), show_alert=True)
+        return
 
     # reset state
     await state.clear()
-    await state.update_data(user=user)
-
-    # create chart
-    charts = create_daily_report_charts(pd.DataFrame(data['charts_data']))
-
-    # create png image from chart
-    image_data = create_chart_image(charts)
-
-    # create aiogram expeced InputFile
-    input_file = BufferedInputFile(image_data, 'report_bar_chart')
 
     await callback.answer()
     await callback.message.edit_reply_markup(reply_markup=None)
-    await callback.message.bot.send_photo(callback.message.chat.id, input_file, reply_markup=k_boards.main_keyboard)
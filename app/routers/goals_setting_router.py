@@ -1,5 +1,4 @@
 from typing import Dict, Any
-import re
 
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
@@ -97,12 +96,12 @@ async def set_custom_goal_name_handler(message: Message, state: FSMContext) -> N
         data = await state.get_data()
         temp_iterator = data['temp_iterator']
 
-        # 2. set custom goal name BUT AS CLASS for future changes
+        # 2. set custom goal name, value will be set on next step
         await state.update_data({f'customGoal_{temp_iterator}': GoalEntity({
             'name': message.text,
             'value': None,
             'change_access': GoalChangeAccessType.deletable.value
-        })})
+        }).model})
         # 3. iterate value
         await state.update_data(temp_iterator=temp_iterator + 1)
 
@@ -126,24 +125,19 @@ async def skip_custom_goal_settinge_handler(
     # 1. convert goals state to db goals object
     final_goals = await state.get_data()
     del final_goals['temp_iterator']
-    del final_goals['user']
 
     # 2. setting goals to db and clean up state
     await database.set_user_goals(callback.from_user.id, final_goals)
     await state.clear()
 
-    # 3. set user for main menu interactions
-    user = await database.get_user(callback.from_user.id)
-    await state.update_data(user=user)
-
-    # 4. handle previous message and answer
+    # 3. handle previous message and answer
     await callback.message.delete()
     await callback.answer()
     await callback.message.answer(get_text('message-setting-goals-completed'), reply_markup=k_boards.main_keyboard)
 
 
-def create_text_for_custom_goal(data: Dict[str, GoalEntity], iterator: int) -> str:
-    return f'{get_text("template-set-custom-goal")} {data[f"customGoal_{iterator}"].name:}'
+def create_text_for_custom_goal(data: Dict[str, GoalEntity.model], iterator: int) -> str:
+    return f'{get_text("template-set-custom-goal")} {data[f"customGoal_{iterator}"]["goalName"]}'
 
 
 # handle complete custom goal setting
@@ -159,7 +153,8 @@ async def complete_custom_goal_settinge_handler(
     data = await state.get_data()
 
     await state.set_state(SetGoalsState.custom_goal)
-    await state.update_data(temp_iterator=1)
+    # iterator points to the next custom goal name, so named goals count is one less
+    await state.update_data(temp_iterator=1, custom_goals_count=data['temp_iterator'] - 1)
     await callback.answer()
 
     await callback.message.answer(create_text_for_custom_goal(data, 1))
@@ -172,31 +167,20 @@ async def set_custom_goal_handler(message: Message, state: FSMContext, database:
     data = await state.get_data()
     temp_iterator = data['temp_iterator']
     custom_goal_key = f'customGoal_{temp_iterator}'
-    goal_entity: GoalEntity = data[custom_goal_key]
-    goal_entity.update_value(int(message.text))
-    # Note. Convert class to model
-    await state.update_data({custom_goal_key: goal_entity.model})
+    await state.update_data({custom_goal_key: {**data[custom_goal_key], 'goalValue': int(message.text)}})
 
     # 2. check count of custom goals
-    data_keys_as_list = list(data.keys())
-    filtered_data_keys = filter(lambda x: re.search('customGoal', x), data_keys_as_list)
-    goals_count = len(list(filtered_data_keys))
-
-    if temp_iterator == goals_count:
+    if temp_iterator == data['custom_goals_count']:
         # 1. convert goals state to db goals object
         final_goals = await state.get_data()
         del final_goals['temp_iterator']
-        del final_goals['user']
+        del final_goals['custom_goals_count']
 
         # 2. setting goals to db and clean up state
         await database.set_user_goals(message.from_user.id, final_goals)
         await state.clear()
 
-        # 3. set user for main menu interactions
-        user = await database.get_user(message.from_user.id)
-        await state.update_data(user=user)
-
-        # 4. answer
+        # 3. answer
         await message.answer(get_text('message-setting-goals-completed'), reply_markup=k_boards.main_keyboard)
     else:
         # 3b. create next iterator
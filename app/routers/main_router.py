@@ -1,18 +1,31 @@
-import pprint
+import asyncio
+from datetime import datetime, timedelta
 
 from aiogram import Router, F, html
-from aiogram.filters import CommandStart, Command
-from aiogram.types import Message, ReplyKeyboardRemove, CallbackQuery
+from aiogram.filters import CommandStart, Command, CommandObject
+from aiogram.types import Message, ReplyKeyboardRemove, CallbackQuery, BufferedInputFile
 from aiogram.fsm.context import FSMContext
 
-from app.services.db_service import DatabaseService
+from app.services.db_service import DatabaseService, kyiv_tz
+from app.services.chart_service import ChartService, ChartServiceBusyError
+from app.services.user_cache import UserCache
 from app.entities.user import UserEntity
 from app.entities.goal import GoalEntity, GoalChangeAccessType
 from app.text_config import get_text
 from app.states import TrackDayState, EditGoalState
 from app.callback_dates import EditGoalCallbackData, EditTrainingTypeGoalCallbackData
 from app.filters import FilterTextMessage, FilterGoalValue
-from app.utils import out_time_tracking, prepare_statistic_data
+from app.utils import out_time_tracking
+from app.rollups import count_streak
+from app.statistics import (
+    Statistic,
+    WEEK_DAYS,
+    STATISTIC_PERIODS,
+    create_statistic,
+    get_period_dates,
+    get_reported_days_count,
+    get_statistic_lines
+)
 
 import app.keyboards as k_boards
 
@@ -20,12 +33,11 @@ main_router = Router()
 
 
 @main_router.message(CommandStart())
-async def start_handler(message: Message, state: FSMContext, database: DatabaseService) -> None:
-    user = await database.get_user(message.from_user.id)
+async def start_handler(message: Message, state: FSMContext, user_cache: UserCache) -> None:
+    user = await user_cache.get(message.from_user.id)
 
     if user is not None:
         await state.clear()
-        await state.update_data(user=user)
         if user['goals'] is not None:
             await message.answer(get_text('message-main-menu'), reply_markup=k_boards.main_keyboard)
         else:
@@ -65,9 +77,9 @@ async def create_profile_handler(message: Message, database: DatabaseService) ->
 
 @main_router.message(F.text == get_text('btn-main-keyboard-track-your-day'))
 async def track_day_handler(message: Message, state: FSMContext, database: DatabaseService) -> None:
-    # get last report and check date
-    last_report = await database.get_last_report()
-    out_of_tracking_message = out_time_tracking(last_report)
+    # get last report date and check it
+    last_report_date = await database.get_last_report_date(message.from_user.id)
+    out_of_tracking_message = out_time_tracking(last_report_date)
 
     # check is available to track
     if out_of_tracking_message is None:
@@ -78,12 +90,12 @@ async def track_day_handler(message: Message, state: FSMContext, database: Datab
 
 
 @main_router.message(F.text == get_text('btn-main-keyboard-show-user-goals'))
-async def show_goals_handler(message: Message, state: FSMContext) -> None:
-    data = await state.get_data()
+async def show_goals_handler(message: Message, state: FSMContext, user_cache: UserCache) -> None:
+    user = await user_cache.get(message.from_user.id)
     await state.set_state(EditGoalState.init)
     await message.answer(
         get_text('message-goal-menu'),
-        reply_markup=k_boards.create_goals_keyboard(data['user']['goals'])
+        reply_markup=k_boards.create_goals_keyboard(user['goals'])
     )
 
 
@@ -91,7 +103,8 @@ async def show_goals_handler(message: Message, state: FSMContext) -> None:
 async def edit_goal_main_handler(
         callback: CallbackQuery,
         callback_data: EditGoalCallbackData,
-        state: FSMContext
+        state: FSMContext,
+        user_cache: UserCache
 ) -> None:
     if callback_data.name:
         await state.update_data({
@@ -103,7 +116,7 @@ async def edit_goal_main_handler(
 
         # branch for updating training type goal
         if callback_data.name == get_text('goal-name-training-type'):
-            data = await state.get_data()
+            user = await user_cache.get(callback.from_user.id)
             await state.set_state(EditGoalState.edit_training_goal_type)
             await callback.answer()
 
@@ -114,7 +127,7 @@ async def edit_goal_main_handler(
             await callback.message.answer(
                 change_training_type_text,
                 reply_markup=k_boards.create_available_training_types_keyboard(
-                    data['user']['goals'][callback_data.key]['goalValue']
+                    user['goals'][callback_data.key]['goalValue']
                 )
             )
         else:
@@ -153,9 +166,8 @@ async def set_new_goal_value_handler(message: Message, state: FSMContext, databa
         'value': int(message.text),
         'change_access': GoalChangeAccessType.deletable.value
     })
-    user_with_new_goal = await database.add_new_user_goal(message.from_user.id, data['goal_key'], goal.model)
+    await database.add_new_user_goal(message.from_user.id, data['goal_key'], goal.model)
 
-    await state.update_data(user=user_with_new_goal)
     await message.answer(get_text('message-goal-new-value-created'), reply_markup=k_boards.main_keyboard)
 
 
@@ -187,9 +199,8 @@ async def edit_training_type_goal_handler(
 async def set_goal_value_handler(message: Message, state: FSMContext, database: DatabaseService) -> None:
     data = await state.get_data()
     await state.clear()
-    updated_user = await database.update_user_goal(message.from_user.id, data['goal_key'], int(message.text))
+    await database.update_user_goal(message.from_user.id, data['goal_key'], int(message.text))
 
-    await state.update_data(user=updated_user)
     await message.answer(get_text('message-goal-new-value-settled'), reply_markup=k_boards.main_keyboard)
 
 
@@ -198,9 +209,8 @@ async def set_goal_value_handler(message: Message, state: FSMContext, database:
 async def delete_goal_handler(message: Message, state: FSMContext, database: DatabaseService) -> None:
     data = await state.get_data()
     await state.clear()
-    updated_user = await database.delete_user_goal(message.from_user.id, data['goal_key'])
+    await database.delete_user_goal(message.from_user.id, data['goal_key'])
 
-    await state.update_data(user=updated_user)
     await message.answer(get_text('message-goal-deleted'), reply_markup=k_boards.main_keyboard)
 
 
@@ -208,8 +218,8 @@ async def delete_goal_handler(message: Message, state: FSMContext, database: Dat
 
 
 @main_router.message(EditGoalState.init, F.text == get_text('btn-edit-goal-keyboard-go-back'))
-async def edit_goal_go_back_handler(message: Message, state: FSMContext) -> None:
-    data = await state.get_data()
+async def edit_goal_go_back_handler(message: Message, state: FSMContext, user_cache: UserCache) -> None:
+    user = await user_cache.get(message.from_user.id)
     await state.update_data({
         'goal_key': None,
         'goal_name': None
@@ -217,13 +227,43 @@ async def edit_goal_go_back_handler(message: Message, state: FSMContext) -> None
 
     await message.answer(
         get_text('message-goal-menu'),
-        reply_markup=k_boards.create_goals_keyboard(data['user']['goals'])
+        reply_markup=k_boards.create_goals_keyboard(user['goals'])
     )
 
 
+async def get_period_statistic(database: DatabaseService, tg_id: int, days: int) -> Statistic:
+    dates = get_period_dates(datetime.now(kyiv_tz), days)
+    rows = await database.get_statistic_rows(tg_id, dates[0], dates[-1] + timedelta(days=1))
+
+    return create_statistic(rows, dates)
+
+
+async def create_statistic_text(database: DatabaseService, tg_id: int, days: int) -> str:
+    statistic = await get_period_statistic(database, tg_id, days)
+
+    # streak can't be longer than the longest period
+    today = datetime.now(kyiv_tz)
+    met_dates = await database.get_met_dates(tg_id, today - timedelta(days=max(STATISTIC_PERIODS)))
+    streak = count_streak(met_dates, today.date())
+
+    return '\n'.join([
+        html.bold(
+            f'{get_text('template-statistic-period-first-part')} {days} '
+            f'{get_text('template-statistic-period-second-part')}'
+        ),
+        *[
+            f'{html.bold(line['title'])}: {get_text('charts-goal-value')} - {line['goal']}, '
+            f'{line['result_label']} - {line['result']}'
+            for line in get_statistic_lines(statistic)
+        ],
+        f'{get_text('template-statistic-streak')} {streak}'
+    ])
+
+
 @main_router.message(F.text == get_text('btn-main-keyboard-statistic'))
 async def statistic_handler(message: Message, state: FSMContext, database: DatabaseService) -> None:
-    reports, remaining_days = await database.get_last_week_reports()
+    statistic = await get_period_statistic(database, message.from_user.id, WEEK_DAYS)
+    remaining_days = WEEK_DAYS - get_reported_days_count(statistic)
 
     if remaining_days:
         await message.answer(
@@ -239,9 +279,51 @@ async def statistic_handler(message: Message, state: FSMContext, database: Datab
 
 @main_router.message(F.text == get_text('btn-statistic-keyboard-text'))
 async def statistic_text_handler(message: Message, state: FSMContext, database: DatabaseService) -> None:
-    await message.answer('Text statistic')
+    statistic_text = await create_statistic_text(database, message.from_user.id, WEEK_DAYS)
+
+    await message.answer(statistic_text, reply_markup=k_boards.main_keyboard)
+
+
+# text statistic for longer periods, e.g. "/statistic 30"
+@main_router.message(Command('statistic'))
+async def period_statistic_handler(message: Message, command: CommandObject, database: DatabaseService) -> None:
+    days = int(command.args) if command.args and command.args.strip().isdigit() else None
+
+    if days not in STATISTIC_PERIODS:
+        await message.answer(
+            f'{get_text('message-statistic-periods')} {', '.join(map(str, STATISTIC_PERIODS))}',
+            reply_markup=k_boards.main_keyboard
+        )
+        return
+
+    statistic_text = await create_statistic_text(database, message.from_user.id, days)
+
+    await message.answer(statistic_text, reply_markup=k_boards.main_keyboard)
 
 
 @main_router.message(F.text == get_text('btn-statistic-keyboard-charts'))
-async def statistic_charts_handler(message: Message, state: FSMContext, database: DatabaseService) -> None:
-    await message.answer('Charts statistic')
+async def statistic_charts_handler(
+        message: Message,
+        state: FSMContext,
+        database: DatabaseService,
+        chart_service: ChartService
+) -> None:
+    statistic = await get_period_statistic(database, message.from_user.id, WEEK_DAYS)
+
+    if statistic['summary'].empty:
+        await message.answer(
+            f'{get_text('message-db-week-not-full')} {WEEK_DAYS}',
+            reply_markup=k_boards.main_keyboard
+        )
+        return
+
+    try:
+        image_data = await chart_service.render_week_report(statistic)
+    except (ChartServiceBusyError, asyncio.TimeoutError):
+        await message.answer(get_text('message-charts-busy'), reply_markup=k_boards.statistic_keyboard)
+        return
+
+    await message.answer_photo(
+        BufferedInputFile(image_data, 'week_report_bar_chart'),
+        reply_markup=k_boards.main_keyboard
+    )
@@ -0,0 +1,102 @@
+import asyncio
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from os import getenv
+from pathlib import Path
+from typing import Any
+
+from dotenv import load_dotenv
+
+from app.loggers import chart_logger
+
+load_dotenv()
+
+
+def get_chart_key(template: str, template_version: int, data: Any) -> str:
+    # same data gives the same image, so key is a hash of canonical (sorted keys) JSON
+    payload = json.dumps([template, template_version, data], sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ChartCache:
+    """
+    Content-addressed cache of rendered chart images.
+
+    Memory tier is LRU bounded by total size of images (`max_bytes`).
+    Disk tier (`directory`, CHART_CACHE_DIR) is optional and isn't bounded, images are
+    written once and never change, so it can be cleaned up by time at any moment.
+    """
+
+    def __init__(self, max_bytes: int | None = None, directory: str | None = None):
+        directory = directory or getenv('CHART_CACHE_DIR')
+
+        self._max_bytes = max_bytes or int(getenv('CHART_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+        self._directory = Path(directory) if directory else None
+        self._images: OrderedDict[str, bytes] = OrderedDict()
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    async def get(self, key: str) -> bytes | None:
+        image_data = self._images.get(key)
+
+        if image_data is not None:
+            self._images.move_to_end(key)
+        elif self._directory is not None:
+            image_data = await asyncio.to_thread(self._read_file, key)
+            if image_data is not None:
+                self._remember(key, image_data)
+
+        if image_data is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+        return image_data
+
+    async def set(self, key: str, image_data: bytes) -> None:
+        self._remember(key, image_data)
+
+        if self._directory is not None:
+            try:
+                await asyncio.to_thread(self._write_file, key, image_data)
+            except OSError as e:
+                # disk tier is optional, image is still cached in memory
+                chart_logger.warning(f'Chart {key} is not written to disk cache: {e}')
+
+    def _remember(self, key: str, image_data: bytes) -> None:
+        # images bigger than the whole cache are not cached
+        if key in self._images or len(image_data) > self._max_bytes:
+            return
+
+        self._images[key] = image_data
+        self._size += len(image_data)
+
+        while self._size > self._max_bytes:
+            _, evicted = self._images.popitem(last=False)
+            self._size -= len(evicted)
+
+    def _get_path(self, key: str) -> Path:
+        return self._directory / key[:2] / f'{key}.chart'
+
+    def _read_file(self, key: str) -> bytes | None:
+        try:
+            return self._get_path(key).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def _write_file(self, key: str, image_data: bytes) -> None:
+        path = self._get_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # readers never see partially written image
+        temp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+        temp_path.write_bytes(image_data)
+        os.replace(temp_path, path)
@@ -0,0 +1,215 @@
+import asyncio
+import functools
+import importlib
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import asdict
+from os import getenv
+from typing import Any, Dict
+
+from dotenv import load_dotenv
+
+from app.loggers import chart_logger
+from app.metrics import CHART_RENDERS, CHART_RENDER_LATENCY
+from app.chart_profiles import ChartProfile, get_chart_profile
+from app.services.chart_cache import ChartCache, get_chart_key
+from app.statistics import Statistic
+
+load_dotenv()
+
+# matplotlib, seaborn and pandas take seconds to import, so app.charts is imported only in workers
+CHARTS_MODULE = 'app.charts'
+# part of cached charts keys, must be bumped on any change of charts look (app/charts.py)
+CHARTS_TEMPLATE_VERSION = 1
+
+
+# entry points for chart workers, module level to stay picklable
+def render_chart(render_name: str, *args: Any) -> bytes:
+    return getattr(importlib.import_module(CHARTS_MODULE), render_name)(*args)
+
+
+def warm_up_worker() -> None:
+    importlib.import_module(CHARTS_MODULE)
+
+
+class ChartServiceBusyError(Exception):
+    pass
+
+
+class ChartService:
+    """
+    Renders charts in a pool of worker processes, so matplotlib never blocks the event loop.
+
+    Queue depth is bounded: when `max_queue_size` jobs are already rendering or waiting
+    for a worker, new jobs are rejected with ChartServiceBusyError instead of piling up.
+    Jobs failed by a dead worker raise it too, the workers are restarted for next jobs.
+    """
+    _executor: ProcessPoolExecutor
+
+    def __init__(
+        self,
+        max_workers: int | None = None,
+        max_queue_size: int | None = None,
+        job_timeout: float | None = None,
+        cache: ChartCache | None = None,
+        profile: ChartProfile | None = None,
+    ):
+        self._max_workers = max_workers or int(getenv('CHART_WORKERS', 2))
+        self._max_queue_size = max_queue_size or int(getenv('CHART_MAX_QUEUE_SIZE', 32))
+        self._job_timeout = job_timeout or float(getenv('CHART_JOB_TIMEOUT', 15))
+        self._pending_jobs = 0
+        self._cache = cache or ChartCache()
+        # output format, resolution and size budget (CHART_PROFILE, see app/chart_profiles.py)
+        self._profile = profile or get_chart_profile()
+        # key -> render in progress, concurrent requests of the same chart wait for it
+        self._rendering: Dict[str, asyncio.Task[bytes]] = {}
+        self._warm_up_task: asyncio.Task | None = None
+        self._executor = self._create_executor()
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        # 'spawn' - motor keeps background threads, forking them is not safe
+        return ProcessPoolExecutor(
+            max_workers=self._max_workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            max_tasks_per_child=int(getenv('CHART_WORKER_MAX_TASKS', 500)),
+        )
+
+    @property
+    def cache(self) -> ChartCache:
+        return self._cache
+
+    @property
+    def pending_jobs(self) -> int:
+        return self._pending_jobs
+
+    async def render_daily_report(self, charts_data: Dict[str, list[int]]) -> bytes:
+        return await self._render_cached(
+            self.get_daily_report_key(charts_data),
+            'render_daily_report_chart',
+            charts_data,
+            self._profile
+        )
+
+    def get_daily_report_key(self, charts_data: Dict[str, list[int]]) -> str:
+        # daily values are often the same for different users (goals reached exactly), so images are cached
+        return get_chart_key('daily_report', CHARTS_TEMPLATE_VERSION, [asdict(self._profile), charts_data])
+
+    async def render_week_report(self, statistic: Statistic) -> bytes:
+        return await self._submit('render_week_report_chart', statistic, self._profile)
+
+    def start_warm_up(self) -> None:
+        # dispatcher startup hook: plotting stack is loaded in background while first updates are served
+        if getenv('CHART_WARM_UP', '1') == '1' and self._warm_up_task is None:
+            self._warm_up_task = asyncio.create_task(self.warm_up())
+
+    async def warm_up(self) -> None:
+        loop = asyncio.get_running_loop()
+        started_at = loop.time()
+
+        # workers are spawned on demand, a job per worker starts all of them
+        workers_warm_up = [
+            loop.run_in_executor(self._executor, warm_up_worker)
+            for _ in range(self._max_workers)
+        ]
+        # statistics are built in the main process
+        await asyncio.to_thread(importlib.import_module, 'pandas')
+        await asyncio.gather(*workers_warm_up)
+
+        chart_logger.info(f'Chart workers are warmed up in {loop.time() - started_at:.2f}s')
+
+    async def _render_cached(self, key: str, render_name: str, *args: Any) -> bytes:
+        image_data = await self._cache.get(key)
+        if image_data is not None:
+            CHART_RENDERS.labels(render_name, 'cache_hit').inc()
+            return image_data
+
+        rendering = self._rendering.get(key)
+
+        if rendering is not None:
+            CHART_RENDERS.labels(render_name, 'shared').inc()
+        else:
+            # the render is a task of its own, not of the first caller:
+            # a cancelled request (update timeout, shutdown) doesn't cancel it for other waiters
+            rendering = asyncio.create_task(self._render(key, render_name, *args))
+            rendering.add_done_callback(self._on_render_done)
+            self._rendering[key] = rendering
+
+        return await asyncio.shield(rendering)
+
+    async def _render(self, key: str, render_name: str, *args: Any) -> bytes:
+        try:
+            image_data = await self._submit(render_name, *args)
+            await self._cache.set(key, image_data)
+        finally:
+            del self._rendering[key]
+
+        return image_data
+
+    @staticmethod
+    def _on_render_done(rendering: asyncio.Task) -> None:
+        # consumed here, so it's not reported as never retrieved when all waiters were cancelled
+        if not rendering.cancelled():
+            rendering.exception()
+
+    async def _submit(self, render_name: str, *args: Any) -> bytes:
+        # back-pressure: reject instead of queueing work we can't finish in time
+        if self._pending_jobs >= self._max_queue_size:
+            chart_logger.warning(f'Chart queue is full ({self._pending_jobs} jobs), rejecting job')
+            CHART_RENDERS.labels(render_name, 'busy').inc()
+            raise ChartServiceBusyError()
+
+        self._pending_jobs += 1
+        loop = asyncio.get_running_loop()
+        started_at = loop.time()
+
+        executor = self._executor
+
+        try:
+            job = executor.submit(render_chart, render_name, *args)
+        except BrokenProcessPool as e:
+            self._pending_jobs -= 1
+            self._replace_broken_executor(executor, render_name)
+            raise ChartServiceBusyError() from e
+
+        # a timed out job can't be stopped in a worker, so it's counted until the worker is done with it
+        job.add_done_callback(functools.partial(self._on_job_done, loop))
+
+        try:
+            image_data = await asyncio.wait_for(asyncio.wrap_future(job), timeout=self._job_timeout)
+        except asyncio.TimeoutError:
+            chart_logger.error(f'Chart job {render_name} timed out after {self._job_timeout}s')
+            CHART_RENDERS.labels(render_name, 'timeout').inc()
+            raise
+        except BrokenProcessPool as e:
+            self._replace_broken_executor(executor, render_name)
+            raise ChartServiceBusyError() from e
+        except Exception:
+            CHART_RENDERS.labels(render_name, 'error').inc()
+            raise
+
+        CHART_RENDERS.labels(render_name, 'rendered').inc()
+        CHART_RENDER_LATENCY.labels(render_name).observe(loop.time() - started_at)
+
+        return image_data
+
+    def _replace_broken_executor(self, executor: ProcessPoolExecutor, render_name: str) -> None:
+        # a worker died (e.g. killed for memory): the pool fails all jobs from then on, so it's replaced once,
+        # by the first job which noticed it
+        CHART_RENDERS.labels(render_name, 'error').inc()
+
+        if executor is self._executor:
+            chart_logger.error('Chart worker died, chart workers are restarted')
+            self._executor = self._create_executor()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _on_job_done(self, loop: asyncio.AbstractEventLoop, _: Future) -> None:
+        # called from an executor thread (or right away, if the job is already done)
+        if not loop.is_closed():
+            loop.call_soon_threadsafe(self._release_job)
+
+    def _release_job(self) -> None:
+        self._pending_jobs -= 1
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
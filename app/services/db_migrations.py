@@ -0,0 +1,325 @@
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from os import getenv
+from typing import Any, Awaitable, Callable, Dict, List
+
+from dotenv import load_dotenv
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING
+from pymongo.errors import OperationFailure
+
+from app.loggers import db_logger
+from app.report_buckets import BucketItem, create_bucket_updates, iterate_bucket_days
+from app.rollups import create_rollup, create_rollup_upsert
+
+load_dotenv()
+
+FSM_COLLECTION_NAME = 'states_and_data'
+MIGRATIONS_COLLECTION_NAME = 'migrations_collection'
+PRE_BUCKETS_REPORTS_COLLECTION_NAME = 'reports_collection_pre_buckets'
+
+
+@dataclass(frozen=True)
+class IndexSpec:
+    collection: str
+    keys: List[tuple[str, int]]
+    name: str
+    unique: bool = False
+    expire_after_seconds: int | None = None
+
+    @property
+    def options(self) -> Dict[str, Any]:
+        options = {'name': self.name, 'unique': self.unique}
+
+        if self.expire_after_seconds is not None:
+            options['expireAfterSeconds'] = self.expire_after_seconds
+
+        return options
+
+
+@dataclass(frozen=True)
+class QuerySpec:
+    name: str
+    collection: str
+    filter: Dict[str, Any]
+    sort: List[tuple[str, int]] = field(default_factory=list)
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    apply: Callable[[AsyncIOMotorDatabase], Awaitable[None]]
+
+
+REPORT_BUCKETS_INDEX = IndexSpec(
+    'report_buckets',
+    [('userTelegramID', ASCENDING), ('month', ASCENDING)],
+    'userTelegramID_month_unique',
+    unique=True
+)
+
+# indexes of main database, keep in sync with queries in DatabaseService
+INDEXES: List[IndexSpec] = [
+    IndexSpec('users_collection', [('telegramID', ASCENDING)], 'telegramID_unique', unique=True),
+    IndexSpec('users_collection', [('lastReportAt', ASCENDING)], 'lastReportAt'),
+    REPORT_BUCKETS_INDEX,
+    IndexSpec(
+        'daily_rollups',
+        [('userTelegramID', ASCENDING), ('date', ASCENDING), ('key', ASCENDING)],
+        'userTelegramID_date_key_unique',
+        unique=True
+    ),
+    # file_id of a chart is reused for CHART_FILES_TTL_SECONDS after upload, a removed one is uploaded again
+    IndexSpec(
+        'chart_files',
+        [('uploadedAt', ASCENDING)],
+        'uploadedAt_ttl',
+        expire_after_seconds=int(getenv('CHART_FILES_TTL_SECONDS', 30 * 24 * 60 * 60))
+    ),
+]
+
+
+def get_fsm_indexes() -> List[IndexSpec]:
+    # FSM records are removed after FSM_TTL_SECONDS of inactivity, disabled by default
+    ttl = getenv('FSM_TTL_SECONDS')
+
+    if not ttl:
+        return []
+
+    return [
+        IndexSpec(FSM_COLLECTION_NAME, [('updatedAt', ASCENDING)], 'updatedAt_ttl', expire_after_seconds=int(ttl))
+    ]
+
+
+# representative DatabaseService queries, checked with explain() for collection scans
+QUERIES: List[QuerySpec] = [
+    QuerySpec('get_user', 'users_collection', {'telegramID': 0}),
+    QuerySpec(
+        'get_not_reported_users',
+        'users_collection',
+        {'$or': [{'lastReportAt': {'$lt': datetime(1970, 1, 1, tzinfo=timezone.utc)}}, {'lastReportAt': None}]}
+    ),
+    QuerySpec('delete_all_reports', 'report_buckets', {'userTelegramID': 0}),
+    QuerySpec('get_reports_charts_data', 'report_buckets', {'userTelegramID': 0, 'month': {'$gte': '1970-01'}}),
+    QuerySpec('get_statistic_rows', 'daily_rollups', {'userTelegramID': 0, 'date': {'$gte': '1970-01-01'}}),
+]
+
+
+async def remove_duplicated_users(db: AsyncIOMotorDatabase) -> None:
+    # users could be created twice (joining the bot + /create_profile), unique index requires cleanup
+    duplicates_cursor = db.users_collection.aggregate([
+        {'$sort': {'_id': ASCENDING}},
+        {'$group': {'_id': '$telegramID', 'ids': {'$push': '$_id'}, 'count': {'$sum': 1}}},
+        {'$match': {'count': {'$gt': 1}}},
+    ])
+
+    async for duplicate in duplicates_cursor:
+        # keep the oldest document
+        await db.users_collection.delete_many({'_id': {'$in': duplicate['ids'][1:]}})
+
+
+async def backfill_last_report_date(db: AsyncIOMotorDatabase) -> None:
+    last_reports_cursor = db.reports_collection.aggregate([
+        {'$group': {'_id': '$userTelegramID', 'lastReportAt': {'$max': '$createdAt'}}},
+    ])
+
+    async for last_report in last_reports_cursor:
+        await db.users_collection.update_one(
+            {'telegramID': last_report['_id']},
+            {'$max': {'lastReportAt': last_report['lastReportAt']}}
+        )
+
+
+async def backfill_daily_rollups_from_reports(db: AsyncIOMotorDatabase, batch_size: int = 1000) -> int:
+    # reports format before monthly buckets (migration 4)
+    rows_cursor = db.reports_collection.aggregate([
+        {'$project': {
+            '_id': 0,
+            'userTelegramID': 1,
+            'date': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$createdAt', 'timezone': 'Europe/Kyiv'}},
+            'fields': {'$objectToArray': '$$ROOT'},
+        }},
+        {'$unwind': '$fields'},
+        # report items are the only embedded documents with tracked value
+        {'$match': {'fields.v.trackedValue': {'$exists': True}}},
+        {'$group': {
+            '_id': {'userTelegramID': '$userTelegramID', 'key': '$fields.k', 'date': '$date'},
+            'title': {'$last': '$fields.v.title'},
+            'trackedValue': {'$sum': '$fields.v.trackedValue'},
+            'goalValue': {'$last': '$fields.v.goalValue'},
+        }},
+    ], allowDiskUse=True)
+
+    operations = []
+    rollups_count = 0
+
+    async for row in rows_cursor:
+        operations.append(create_rollup_upsert(create_rollup(
+            row['_id']['userTelegramID'],
+            row['_id']['date'],
+            row['_id']['key'],
+            row['title'],
+            row['trackedValue'],
+            row['goalValue']
+        )))
+
+        if len(operations) == batch_size:
+            await db.daily_rollups.bulk_write(operations, ordered=False)
+            rollups_count += len(operations)
+            operations = []
+
+    if operations:
+        await db.daily_rollups.bulk_write(operations, ordered=False)
+        rollups_count += len(operations)
+
+    return rollups_count
+
+
+async def backfill_daily_rollups(db: AsyncIOMotorDatabase, batch_size: int = 1000) -> int:
+    operations = []
+    rollups_count = 0
+
+    async for bucket in db.report_buckets.find({}, {'_id': 0}):
+        for day in iterate_bucket_days(bucket):
+            day_index = day.day - 1
+
+            for key, item in bucket['items'].items():
+                if item['tracked'][day_index] is None:
+                    continue
+
+                operations.append(create_rollup_upsert(create_rollup(
+                    bucket['userTelegramID'],
+                    day.strftime('%Y-%m-%d'),
+                    key,
+                    item['title'],
+                    item['tracked'][day_index],
+                    item['goal'][day_index]
+                )))
+
+            if len(operations) >= batch_size:
+                await db.daily_rollups.bulk_write(operations, ordered=False)
+                rollups_count += len(operations)
+                operations = []
+
+    if operations:
+        await db.daily_rollups.bulk_write(operations, ordered=False)
+        rollups_count += len(operations)
+
+    return rollups_count
+
+
+async def move_reports_to_buckets(db: AsyncIOMotorDatabase, batch_size: int = 1000) -> None:
+    # reports are replayed in creation order, so the latest report of a day wins as with new writes.
+    # Bucket updates are idempotent: if the migration is interrupted it's applied again from the start
+    await db.report_buckets.create_index(REPORT_BUCKETS_INDEX.keys, **REPORT_BUCKETS_INDEX.options)
+
+    operations = []
+
+    async for report in db.reports_collection.find({}).sort('createdAt', ASCENDING):
+        items: List[BucketItem] = [
+            {
+                'key': key,
+                'title': value['title'],
+                'color': value.get('color'),
+                'tracked_value': value['trackedValue'],
+                'goal_value': value['goalValue'],
+            }
+            # report items are the only embedded documents with tracked value
+            for key, value in report.items()
+            if isinstance(value, dict) and 'trackedValue' in value
+        ]
+        operations.extend(create_bucket_updates(report['userTelegramID'], report['createdAt'], items))
+
+        if len(operations) >= batch_size:
+            await db.report_buckets.bulk_write(operations)
+            operations = []
+
+    if operations:
+        await db.report_buckets.bulk_write(operations)
+
+    # old reports are kept aside until the buckets are checked, the collection is dropped manually
+    if 'reports_collection' in await db.list_collection_names():
+        await db.reports_collection.rename(PRE_BUCKETS_REPORTS_COLLECTION_NAME)
+
+
+# append only, versions must grow
+MIGRATIONS: List[Migration] = [
+    Migration(1, 'remove duplicated users', remove_duplicated_users),
+    Migration(2, 'backfill users lastReportAt', backfill_last_report_date),
+    Migration(3, 'backfill daily rollups', backfill_daily_rollups_from_reports),
+    Migration(4, 'move reports to monthly buckets', move_reports_to_buckets),
+]
+
+
+class MigrationRunner:
+    def __init__(self, db: AsyncIOMotorDatabase, fsm_db: AsyncIOMotorDatabase):
+        self._db = db
+        self._fsm_db = fsm_db
+        self._migrations_collection = db[MIGRATIONS_COLLECTION_NAME]
+
+    async def get_version(self) -> int:
+        document = await self._migrations_collection.find_one({'_id': 'schema'})
+
+        return document['version'] if document else 0
+
+    async def run(self) -> None:
+        await self.apply_migrations()
+        await self.apply_indexes()
+
+        collscans = await self.find_collscans()
+        if collscans:
+            db_logger.warning(f'Queries with collection scan: {", ".join(collscans)}')
+
+    async def apply_migrations(self) -> None:
+        current_version = await self.get_version()
+
+        for migration in sorted(MIGRATIONS, key=lambda x: x.version):
+            if migration.version <= current_version:
+                continue
+
+            db_logger.info(f'Applying migration {migration.version}: {migration.description}')
+            await migration.apply(self._db)
+            await self._migrations_collection.update_one(
+                {'_id': 'schema'},
+                {'$set': {'version': migration.version, 'appliedAt': datetime.now(timezone.utc)}},
+                upsert=True
+            )
+
+    async def apply_indexes(self) -> None:
+        # create_index is a no-op for existing index with the same keys and options
+        for index in INDEXES:
+            await MigrationRunner._create_index(self._db, index)
+
+        for index in get_fsm_indexes():
+            await MigrationRunner._create_index(self._fsm_db, index)
+
+    @staticmethod
+    async def _create_index(db: AsyncIOMotorDatabase, index: IndexSpec) -> None:
+        try:
+            await db[index.collection].create_index(index.keys, **index.options)
+        except OperationFailure as e:
+            # IndexOptionsConflict - TTL was changed, it can be updated in place
+            if e.code != 85 or index.expire_after_seconds is None:
+                raise
+
+            await db.command('collMod', index.collection, index={
+                'name': index.name,
+                'expireAfterSeconds': index.expire_after_seconds,
+            })
+
+    async def find_collscans(self) -> List[str]:
+        collscans = []
+
+        for query in QUERIES:
+            cursor = self._db[query.collection].find(query.filter)
+            if query.sort:
+                cursor = cursor.sort(query.sort)
+
+            plan = await cursor.explain()
+
+            if 'COLLSCAN' in str(plan['queryPlanner']['winningPlan']):
+                collscans.append(query.name)
+
+        return collscans
@@ -1,60 +1,225 @@
+import asyncio
 from os import getenv
-from datetime import datetime, timedelta
+from typing import Callable, Dict, List, NotRequired, TypedDict
+from datetime import date, datetime
 import pytz
 
 from dotenv import load_dotenv
 
+from bson import ObjectId
 from bson.codec_options import CodecOptions
-from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection
-from pymongo.errors import ServerSelectionTimeoutError
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection, AsyncIOMotorCursor, AsyncIOMotorDatabase
+from pymongo import ASCENDING, UpdateOne, WriteConcern
+from pymongo.errors import ConnectionFailure, PyMongoError
 
 from app.loggers import db_logger
+from app.metrics import DATABASE_READY, MongoCommandListener, db_operation, track_db_operations
+from app.services.db_migrations import MigrationRunner, backfill_daily_rollups
+from app.services.report_buffer import PendingReport, ReportWriteBuffer
 from app.entities.user import UserEntity, GoalsType
 from app.entities.goal import GoalEntity
 from app.entities.report import ReportEntity
-from app.utils import validate_last_week_dates
+from app.report_buckets import (
+    BucketItem,
+    create_bucket_updates,
+    get_bucket_charts_data,
+    get_bucket_month,
+    get_report_items,
+    iterate_bucket_days,
+)
+from app.rollups import DailyRollup, create_report_rollups, create_rollup_upsert
 
 load_dotenv()
 
 kyiv_tz = pytz.timezone('Europe/Kyiv')
 
+KYIV_CODEC_OPTIONS = CodecOptions(tz_aware=True, tzinfo=kyiv_tz)
 
+DB_NAME = 'daily-report-bot'
+FSM_DB_NAME = 'daily-report-bot-fsm'
+
+
+class PendingReportRecord(TypedDict):
+    # report journaled before it's queued in the write buffer (collection pending_reports)
+    _id: NotRequired[ObjectId]
+    userTelegramID: int
+    createdAt: datetime
+    items: List[BucketItem]
+    rollups: List[DailyRollup]
+
+
+@track_db_operations
 class DatabaseService:
     _client: AsyncIOMotorClient
+    _db: AsyncIOMotorDatabase
     _users_collection: AsyncIOMotorCollection
-    _reports_collection: AsyncIOMotorCollection
+    _report_buckets_collection: AsyncIOMotorCollection
+    _rollups_collection: AsyncIOMotorCollection
+    _chart_files_collection: AsyncIOMotorCollection
+    _pending_reports_collection: AsyncIOMotorCollection
 
-    def __init__(self):
-        client = AsyncIOMotorClient(
+    def __init__(
+        self,
+        client: AsyncIOMotorClient | None = None,
+        codec_options: CodecOptions | None = KYIV_CODEC_OPTIONS
+    ):
+        self._user_change_listeners: List[Callable[[int], None]] = []
+
+        # client is passed by benchmarks (local Mongo stand-in), the bot connects with env settings.
+        # Client doesn't do any I/O here, servers are reached in connect() or by the first query
+        client = client or AsyncIOMotorClient(
             getenv('MONGO_DB_HOST'),
             username=getenv('MONGO_DB_USERNAME'),
             password=getenv('MONGO_DB_PASSWORD'),
             authMechanism='SCRAM-SHA-1',
+            maxPoolSize=int(getenv('MONGO_MAX_POOL_SIZE', 100)),
+            minPoolSize=int(getenv('MONGO_MIN_POOL_SIZE', 10)),
+            maxIdleTimeMS=int(getenv('MONGO_MAX_IDLE_TIME_MS', 300000)),
+            serverSelectionTimeoutMS=int(getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000)),
+            connectTimeoutMS=int(getenv('MONGO_CONNECT_TIMEOUT_MS', 5000)),
+            event_listeners=[MongoCommandListener()],
         )
+        db = client[DB_NAME]
 
-        try:
-            if client.is_primary:
-                db = client['daily-report-bot']
-                # define timezone
-                options = CodecOptions(tz_aware=True, tzinfo=kyiv_tz)
-
-                # defining main fields: collections and client
-                self._client = client
-                self._users_collection = db.users_collection
-                self._reports_collection = db.reports_collection.with_options(codec_options=options)
-                db_logger.info('Database successfully connected')
-        except ServerSelectionTimeoutError:
-            db_logger.error('Connection failed')
+        # defining main fields: collections and client
+        self._client = client
+        self._db = db
+        self._users_collection = db.users_collection
+        self._report_buckets_collection = db.report_buckets
+        # journal writes are acknowledged after they are in the server's on-disk journal
+        self._pending_reports_collection = db.get_collection('pending_reports', write_concern=WriteConcern(j=True))
+
+        # dates are read in Kyiv timezone, None keeps client's options (Mongo stand-in of benchmarks)
+        if codec_options is not None:
+            self._users_collection = self._users_collection.with_options(codec_options=codec_options)
+            self._report_buckets_collection = self._report_buckets_collection.with_options(codec_options=codec_options)
+            self._pending_reports_collection = self._pending_reports_collection.with_options(codec_options=codec_options)
+
+        self._rollups_collection = db.daily_rollups
+        self._chart_files_collection = db.chart_files
+
+        self._report_buffer = ReportWriteBuffer(self._write_reports)
+        self._is_ready = False
+        self._health_check_task: asyncio.Task | None = None
 
     @property
     def client(self):
         return self._client
 
+    @property
+    def is_ready(self) -> bool:
+        # readiness probe: connected and the last health check passed
+        return self._is_ready
+
+    async def connect(self, retries: int | None = None, retry_delay: float = 1):
+        # waits for the server without blocking the loop, retrying with exponential backoff,
+        # then opens MONGO_MIN_POOL_SIZE connections, so the first burst of updates doesn't wait for them
+        if retries is None:
+            retries = int(getenv('MONGO_CONNECT_RETRIES', 5))
+
+        for attempt in range(retries + 1):
+            try:
+                await self._ping()
+                break
+            except ConnectionFailure as e:
+                if attempt == retries:
+                    db_logger.error(f'Connection failed: {e}')
+                    raise
+
+                delay = retry_delay * 2 ** attempt
+                db_logger.warning(f'Connection failed, retrying in {delay:g}s: {e}')
+                await asyncio.sleep(delay)
+
+        # concurrent commands check out separate connections
+        await asyncio.gather(*[self._ping() for _ in range(self._client.options.pool_options.min_pool_size)])
+
+        await self._replay_pending_reports()
+
+        self._set_ready(True)
+        db_logger.info('Database successfully connected')
+
+    async def _replay_pending_reports(self):
+        # reports journaled but not written before the bot was stopped (killed, failed flush on shutdown),
+        # all records are of this process: the bot runs as a single process per database (see CachedStorage).
+        # Their writes are idempotent, so a report written before its record was removed is applied again harmlessly
+        replayed_count = 0
+
+        async for record in self._pending_reports_collection.find({}).sort('createdAt', ASCENDING):
+            await self._report_buffer.add(self._create_pending_report(record))
+            replayed_count += 1
+
+        if replayed_count:
+            db_logger.warning(f'{replayed_count} journaled reports are queued again')
+
+    async def check_health(self, retries: int = 2, retry_delay: float = 1) -> bool:
+        for attempt in range(retries + 1):
+            try:
+                await self._ping()
+                break
+            except PyMongoError as e:
+                # not only network errors: e.g. a failed authentication must not leave the service ready
+                if attempt == retries:
+                    if self._is_ready:
+                        db_logger.error(f'Health check failed: {e}')
+                    self._set_ready(False)
+                    return False
+
+                await asyncio.sleep(retry_delay)
+
+        if not self._is_ready:
+            db_logger.info('Database is available again')
+        self._set_ready(True)
+
+        return True
+
+    def start_health_checks(self) -> None:
+        # dispatcher startup hook
+        if self._health_check_task is None:
+            self._health_check_task = asyncio.create_task(self._run_health_checks())
+
+    async def stop_health_checks(self) -> None:
+        if self._health_check_task is not None:
+            self._health_check_task.cancel()
+            self._health_check_task = None
+
+    async def _run_health_checks(self) -> None:
+        interval = float(getenv('MONGO_HEALTH_CHECK_INTERVAL_SECONDS', 30))
+
+        while True:
+            await asyncio.sleep(interval)
+            await self.check_health()
+
+    def _set_ready(self, is_ready: bool):
+        self._is_ready = is_ready
+        DATABASE_READY.set(is_ready)
+
+    async def _ping(self):
+        await self._client.admin.command('ping')
+
+    async def migrate(self):
+        # applies pending migrations and declared indexes (app/services/db_migrations.py)
+        await MigrationRunner(self._db, self._client[FSM_DB_NAME]).run()
+
+    def subscribe_user_changes(self, listener: Callable[[int], None]):
+        # listener is called with telegramID after any change of user document (caches invalidation)
+        self._user_change_listeners.append(listener)
+
+    def _notify_user_changed(self, tg_id: int):
+        for listener in self._user_change_listeners:
+            listener(tg_id)
+
     async def create_user(self, user: UserEntity.model):
-        await self._users_collection.insert_one(user)
+        # user can join the bot and create profile, telegramID is unique
+        await self._users_collection.update_one(
+            {'telegramID': user['telegramID']},
+            {'$setOnInsert': user},
+            upsert=True
+        )
+        self._notify_user_changed(user['telegramID'])
 
     async def set_user_goals(self, tg_id: int, goals: GoalsType):
         await self._users_collection.update_one({'telegramID': tg_id}, {'$set': {'goals': goals}})
+        self._notify_user_changed(tg_id)
 
     async def add_new_user_goal(self, tg_id: int, goal_field: str, goal: GoalEntity.model):
         updated_user = await self._users_collection.find_one_and_update({
@@ -62,6 +227,7 @@ class DatabaseService:
             {'$set': {f'goals.{goal_field}': goal}},
             return_document=True
         )
+        self._notify_user_changed(tg_id)
 
         return updated_user
 
@@ -71,6 +237,7 @@ class DatabaseService:
             {'$set': {f'goals.{goal_field}.goalValue': new_value}},
             return_document=True
         )
+        self._notify_user_changed(tg_id)
 
         return updated_user
 
@@ -79,6 +246,7 @@ class DatabaseService:
             'telegramID': tg_id},
             {'$set': {f'goals.trainingGoalType.goalValue': new_type}},
         )
+        self._notify_user_changed(tg_id)
 
     async def delete_user_goal(self, tg_id: int, goal_field: str):
         updated_user = await self._users_collection.find_one_and_update({
@@ -86,41 +254,174 @@ class DatabaseService:
             {'$unset': {f'goals.{goal_field}': ''}},
             return_document=True
         )
+        self._notify_user_changed(tg_id)
 
         return updated_user
 
     async def delete_user(self, tg_id: int):
         await self._users_collection.delete_one({'telegramID': tg_id})
+        self._notify_user_changed(tg_id)
 
     async def get_user(self, tg_id: int):
         user = await self._users_collection.find_one({'telegramID': tg_id})
 
         return user
 
+    def get_not_reported_users(self, since: datetime) -> AsyncIOMotorCursor:
+        # users with goals without reports since given time, streamed by cursor (for reminders).
+        # lastReportAt is set when the report is written, so users with reports in the write buffer are excluded here
+        users_filter = {
+            '$or': [{'lastReportAt': {'$lt': since}}, {'lastReportAt': None}],
+            'goals': {'$ne': None},
+        }
+
+        reported_users = self._report_buffer.get_reported_users(since)
+        if reported_users:
+            users_filter['telegramID'] = {'$nin': reported_users}
+
+        return self._users_collection.find(
+            users_filter,
+            {'_id': 0, 'telegramID': 1},
+            batch_size=1000
+        )
+
     async def create_report(self, report: ReportEntity):
         report.set_created_at(datetime.now(pytz.timezone('Europe/Kyiv')))
 
-        await self._reports_collection.insert_one(report.model)
+        # the report is saved once it's in the journal (user is answered after that),
+        # written in batches by the report buffer (see _write_reports) and replayed by connect() after a crash
+        record: PendingReportRecord = {
+            'userTelegramID': report.user_tg_id,
+            'createdAt': report.date,
+            'items': get_report_items(report),
+            'rollups': create_report_rollups(report),
+        }
+        await self._pending_reports_collection.insert_one(record)
+
+        await self._report_buffer.add(self._create_pending_report(record))
+
+    @staticmethod
+    def _create_pending_report(record: PendingReportRecord) -> PendingReport:
+        return PendingReport(
+            user_tg_id=record['userTelegramID'],
+            created_at=record['createdAt'],
+            journal_id=record['_id'],
+            bucket_updates=create_bucket_updates(record['userTelegramID'], record['createdAt'], record['items']),
+            rollup_upserts=[create_rollup_upsert(rollup) for rollup in record['rollups']],
+        )
+
+    async def close(self):
+        # dispatcher shutdown hook: pending reports are written before exit
+        try:
+            await self._report_buffer.close()
+        except PyMongoError as e:
+            db_logger.error(f'{self._report_buffer.pending_count} pending reports are left for replay on start: {e!r}')
+
+    async def _write_reports(self, reports: List[PendingReport]):
+        # all writes must stay idempotent: failed batches are written again by the report buffer
+        # and journaled reports are replayed on start even if they were written before
+        # flushes run in background tasks, their commands are labeled separately from create_report
+        db_operation_token = db_operation.set('write_reports')
+
+        try:
+            # ordered: bucket arrays are created before values are set (see app/report_buckets.py)
+            await self._report_buckets_collection.bulk_write(
+                [update for report in reports for update in report.bucket_updates]
+            )
+
+            # denormalized date of latest report, so tracking checks are a single point lookup.
+            # Reports are in creation order, the latest one of a user wins
+            last_report_dates = {report.user_tg_id: report.created_at for report in reports}
+            await self._users_collection.bulk_write(
+                [
+                    UpdateOne({'telegramID': tg_id}, {'$max': {'lastReportAt': last_report_date}})
+                    for tg_id, last_report_date in last_report_dates.items()
+                ],
+                ordered=False
+            )
+            for tg_id in last_report_dates:
+                self._notify_user_changed(tg_id)
+
+            # ordered: a later report of the same day overwrites rollups of the earlier one
+            await self._rollups_collection.bulk_write([upsert for report in reports for upsert in report.rollup_upserts])
+
+            await self._pending_reports_collection.delete_many({'_id': {'$in': [report.journal_id for report in reports]}})
+        finally:
+            db_operation.reset(db_operation_token)
 
     async def delete_all_reports(self, user_tg_id: int):
-        await self._reports_collection.delete_many({'userTelegramID': user_tg_id})
+        await self._report_buffer.discard_user_reports(user_tg_id)
+        await self._pending_reports_collection.delete_many({'userTelegramID': user_tg_id})
+        await self._report_buckets_collection.delete_many({'userTelegramID': user_tg_id})
+        await self._rollups_collection.delete_many({'userTelegramID': user_tg_id})
+
+    async def get_last_report_date(self, user_tg_id: int) -> datetime | None:
+        pending_report_date = self._report_buffer.get_last_report_date(user_tg_id)
+        if pending_report_date is not None:
+            return pending_report_date
+
+        user = await self._users_collection.find_one({'telegramID': user_tg_id}, {'lastReportAt': 1})
+
+        return user.get('lastReportAt') if user else None
 
-    async def get_last_report(self):
-        return await self._reports_collection.find_one(sort=[('_id', -1)])
+    async def get_report_charts_data(self, user_tg_id: int, day: date) -> Dict[str, list[int]] | None:
+        # charts data of a saved report (reports still in the write buffer aren't visible)
+        reports_charts_data = await self.get_reports_charts_data(user_tg_id, day, day)
 
-    async def get_last_week_reports(self):
-        now = datetime.now(kyiv_tz)
-        last_week = now - timedelta(days=7)
+        return reports_charts_data.get(day)
 
-        # Query to find documents where 'createdAt' is within the last 7 days
-        reports_cursor = self._reports_collection.find({
-            'createdAt': {
-                '$gte': last_week,
-                '$lt': now
-            }
-        })
+    async def get_reports_charts_data(self, user_tg_id: int, start: date, end: date) -> Dict[date, Dict[str, list[int]]]:
+        # local (Kyiv) dates, both inclusive
+        buckets_cursor = self._report_buckets_collection.find(
+            {'userTelegramID': user_tg_id, 'month': {'$gte': get_bucket_month(start), '$lte': get_bucket_month(end)}},
+            {'_id': 0, 'month': 1, 'createdAt': 1, 'items': 1}
+        )
+
+        return {
+            day: get_bucket_charts_data(bucket, day)
+            async for bucket in buckets_cursor
+            for day in iterate_bucket_days(bucket)
+            if start <= day <= end
+        }
+
+    async def get_statistic_rows(self, user_tg_id: int, start: datetime, end: datetime):
+        # one row per report item per day, read from pre-aggregated daily rollups
+        rows_cursor = self._rollups_collection.find(
+            {
+                'userTelegramID': user_tg_id,
+                'date': {'$gte': start.strftime('%Y-%m-%d'), '$lt': end.strftime('%Y-%m-%d')}
+            },
+            {'_id': 0, 'key': 1, 'date': 1, 'title': 1, 'trackedValue': 1, 'goalValue': 1}
+        )
+
+        return await rows_cursor.to_list(None)
+
+    async def get_met_dates(self, user_tg_id: int, since: datetime) -> set[str]:
+        # dates (YYYY-MM-DD) when all tracked goals were met
+        met_dates_cursor = self._rollups_collection.aggregate([
+            {'$match': {'userTelegramID': user_tg_id, 'date': {'$gte': since.strftime('%Y-%m-%d')}}},
+            {'$group': {'_id': '$date', 'met': {'$min': '$met'}}},
+            {'$match': {'met': True}},
+        ])
+
+        return {met_date['_id'] async for met_date in met_dates_cursor}
+
+    async def get_chart_file_id(self, chart_key: str) -> str | None:
+        # chart key (content hash) -> telegram file_id of already uploaded image
+        chart_file = await self._chart_files_collection.find_one({'_id': chart_key})
+
+        return chart_file['fileID'] if chart_file else None
+
+    async def save_chart_file_id(self, chart_key: str, file_id: str):
+        await self._chart_files_collection.update_one(
+            {'_id': chart_key},
+            {'$set': {'fileID': file_id, 'uploadedAt': datetime.now(kyiv_tz)}},
+            upsert=True
+        )
 
-        last_week_reports = await reports_cursor.to_list(7)
-        remaining_days = validate_last_week_dates(last_week_reports)
+    async def delete_chart_file_id(self, chart_key: str):
+        await self._chart_files_collection.delete_one({'_id': chart_key})
 
-        return last_week_reports, remaining_days
+    async def backfill_rollups(self) -> int:
+        # rebuilds rollups from report buckets, safe to run several times
+        return await backfill_daily_rollups(self._db)
@@ -0,0 +1,235 @@
+import time
+from collections import OrderedDict
+from copy import deepcopy
+from datetime import datetime, timezone
+from os import getenv
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey, StateType
+from aiogram.fsm.storage.mongo import MongoStorage
+
+load_dotenv()
+
+
+class TimestampedMongoStorage(MongoStorage):
+    """
+    MongoStorage that stamps every write with 'updatedAt',
+    so idle FSM records can be expired by a TTL index (see FSM_INDEXES in db_migrations.py).
+    """
+
+    @staticmethod
+    def _is_empty(document: Dict[str, Any] | None) -> bool:
+        return document is not None and set(document.keys()) <= {'updatedAt'}
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        document_id = self._key_builder.build(key)
+        updated_at = datetime.now(timezone.utc)
+
+        if state is None:
+            updated = await self._collection.find_one_and_update(
+                filter={'_id': document_id},
+                update={'$unset': {'state': 1}, '$set': {'updatedAt': updated_at}},
+                projection={'_id': 0},
+                return_document=True,
+            )
+            if self._is_empty(updated):
+                await self._collection.delete_one({'_id': document_id})
+        else:
+            await self._collection.update_one(
+                filter={'_id': document_id},
+                update={'$set': {'state': self.resolve_state(state), 'updatedAt': updated_at}},
+                upsert=True,
+            )
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        document_id = self._key_builder.build(key)
+        updated_at = datetime.now(timezone.utc)
+
+        if not data:
+            updated = await self._collection.find_one_and_update(
+                filter={'_id': document_id},
+                update={'$unset': {'data': 1}, '$set': {'updatedAt': updated_at}},
+                projection={'_id': 0},
+                return_document=True,
+            )
+            if self._is_empty(updated):
+                await self._collection.delete_one({'_id': document_id})
+        else:
+            await self._collection.update_one(
+                filter={'_id': document_id},
+                update={'$set': {'data': data, 'updatedAt': updated_at}},
+                upsert=True,
+            )
+
+    async def update_data(self, key: StorageKey, data: Dict[str, Any]) -> Dict[str, Any]:
+        document_id = self._key_builder.build(key)
+        update_with = {f'data.{field}': value for field, value in data.items()}
+        update_with['updatedAt'] = datetime.now(timezone.utc)
+
+        update_result = await self._collection.find_one_and_update(
+            filter={'_id': document_id},
+            update={'$set': update_with},
+            upsert=True,
+            return_document=True,
+            projection={'_id': 0},
+        )
+
+        return update_result.get('data', {})
+
+    async def get_state_and_data(self, key: StorageKey) -> tuple[Optional[str], Dict[str, Any]]:
+        document = await self._collection.find_one({'_id': self._key_builder.build(key)})
+
+        if document is None:
+            return None, {}
+
+        return document.get('state'), document.get('data') or {}
+
+    async def set_state_and_data(self, key: StorageKey, state: StateType, data: Dict[str, Any]) -> None:
+        # single round trip for handlers which change both state and data (see FSMWriteBackMiddleware)
+        document_id = self._key_builder.build(key)
+        resolved_state = self.resolve_state(state)
+
+        if resolved_state is None and not data:
+            await self._collection.delete_one({'_id': document_id})
+            return
+
+        update: Dict[str, Dict[str, Any]] = {'$set': {'updatedAt': datetime.now(timezone.utc)}}
+
+        if resolved_state is None:
+            update['$unset'] = {'state': 1}
+        else:
+            update['$set']['state'] = resolved_state
+
+        if data:
+            update['$set']['data'] = data
+        else:
+            update.setdefault('$unset', {})['data'] = 1
+
+        await self._collection.update_one({'_id': document_id}, update, upsert=True)
+
+
+class CachedStorage(BaseStorage):
+    """
+    In-process LRU (with TTL) in front of another FSM storage, all writes go through to it.
+    Cache is per process: the bot runs as a single process per database
+    (user cache and report write buffer are per process as well).
+    """
+
+    def __init__(self, storage: BaseStorage, max_size: int | None = None, ttl: float | None = None) -> None:
+        self._storage = storage
+        self._max_size = max_size or int(getenv('FSM_CACHE_SIZE', 10000))
+        self._ttl = ttl or float(getenv('FSM_CACHE_TTL_SECONDS', 300))
+        # key -> (state, data, expires at)
+        self._entries: OrderedDict[StorageKey, tuple[Optional[str], Dict[str, Any], float]] = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def hits(self) -> int:
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        return self._misses
+
+    @property
+    def hit_rate(self) -> float:
+        requests = self._hits + self._misses
+
+        return self._hits / requests if requests else 0.0
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await self._storage.set_state(key=key, state=state)
+
+        entry = self._get_entry(key)
+        if entry is not None:
+            self._set_entry(key, CachedStorage._resolve_state(state), entry[1])
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _ = await self._load(key)
+
+        return state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        await self._storage.set_data(key=key, data=data)
+
+        entry = self._get_entry(key)
+        if entry is not None:
+            self._set_entry(key, entry[0], deepcopy(data))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, data = await self._load(key)
+
+        return deepcopy(data)
+
+    async def update_data(self, key: StorageKey, data: Dict[str, Any]) -> Dict[str, Any]:
+        updated_data = await self._storage.update_data(key=key, data=data)
+
+        entry = self._get_entry(key)
+        if entry is not None:
+            self._set_entry(key, entry[0], deepcopy(updated_data))
+
+        return updated_data
+
+    async def set_state_and_data(self, key: StorageKey, state: StateType, data: Dict[str, Any]) -> None:
+        set_state_and_data = getattr(self._storage, 'set_state_and_data', None)
+
+        if set_state_and_data is None:
+            await self._storage.set_state(key=key, state=state)
+            await self._storage.set_data(key=key, data=data)
+        else:
+            await set_state_and_data(key=key, state=state, data=data)
+
+        self._set_entry(key, CachedStorage._resolve_state(state), deepcopy(data))
+
+    async def close(self) -> None:
+        self._entries.clear()
+        await self._storage.close()
+
+    async def _load(self, key: StorageKey) -> tuple[Optional[str], Dict[str, Any]]:
+        entry = self._get_entry(key)
+
+        if entry is not None:
+            self._hits += 1
+            return entry[0], entry[1]
+
+        self._misses += 1
+
+        get_state_and_data = getattr(self._storage, 'get_state_and_data', None)
+        if get_state_and_data is None:
+            state = await self._storage.get_state(key=key)
+            data = await self._storage.get_data(key=key)
+        else:
+            state, data = await get_state_and_data(key=key)
+
+        self._set_entry(key, state, data)
+
+        return state, data
+
+    def _get_entry(self, key: StorageKey) -> tuple[Optional[str], Dict[str, Any], float] | None:
+        entry = self._entries.get(key)
+
+        if entry is None:
+            return None
+
+        if entry[2] < time.monotonic():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+
+        return entry
+
+    def _set_entry(self, key: StorageKey, state: Optional[str], data: Dict[str, Any]) -> None:
+        self._entries[key] = (state, data, time.monotonic() + self._ttl)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    @staticmethod
+    def _resolve_state(state: StateType) -> Optional[str]:
+        return state.state if isinstance(state, State) else state
@@ -0,0 +1,54 @@
+from typing import Dict, Iterable
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import InputFile, TelegramObject
+from aiohttp import FormData
+
+
+class PreparedMarkupSession(AiohttpSession):
+    """
+    Bot session which sends constant reply markups (module-level keyboards) as JSON serialized once,
+    other markups are dumped and serialized on every request as usual.
+
+    Markups are recognized by identity, so only objects living as long as the session may be passed
+    (not LRU-cached ones: a new markup could get the id of an evicted one) and they must not be mutated.
+
+    Bot(token=TOKEN, session=PreparedMarkupSession(STATIC_MARKUPS))
+    """
+
+    def __init__(self, static_markups: Iterable[TelegramObject] = (), **kwargs):
+        super().__init__(**kwargs)
+        # keeps ids from being reused
+        self._static_markups = tuple(static_markups)
+        # id(markup) -> JSON, the same as prepare_value gives for a markup; markups have no Default or file fields,
+        # so bot isn't needed here
+        self._prepared_markups: Dict[int, str] = {
+            id(markup): self.prepare_value(markup, bot=None, files={})
+            for markup in self._static_markups
+        }
+
+    def build_form_data(self, bot: Bot, method: TelegramMethod[TelegramType]) -> FormData:
+        prepared_markup = self._prepared_markups.get(id(getattr(method, 'reply_markup', None)))
+
+        if prepared_markup is None:
+            return super().build_form_data(bot, method)
+
+        # as AiohttpSession.build_form_data, without dumping of the markup
+        form = FormData(quote_fields=False)
+        files: Dict[str, InputFile] = {}
+        for key, value in method.model_dump(warnings=False, exclude={'reply_markup'}).items():
+            value = self.prepare_value(value, bot=bot, files=files)
+            if not value:
+                continue
+            form.add_field(key, value)
+        form.add_field('reply_markup', prepared_markup)
+        for key, value in files.items():
+            form.add_field(
+                key,
+                value.read(bot),
+                filename=value.filename or key,
+            )
+        return form
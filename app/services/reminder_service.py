@@ -0,0 +1,160 @@
+import asyncio
+import heapq
+import itertools
+import time
+from datetime import date, datetime, timedelta, time as day_time
+from os import getenv
+from typing import Awaitable, Callable, List
+
+from dotenv import load_dotenv
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramForbiddenError, TelegramRetryAfter
+
+from app.loggers import reminder_logger
+from app.metrics import db_operation
+from app.services.send_queue import SendPriority, send_priority
+from app.services.db_service import DatabaseService, kyiv_tz
+from app.text_config import get_text
+
+import app.keyboards as k_boards
+
+load_dotenv()
+
+# local (Kyiv) time of evening reminder, empty value disables it
+REMINDER_TIME = getenv('REMINDER_TIME', '20:00')
+
+Job = Callable[[], Awaitable[None]]
+
+
+class Scheduler:
+    """
+    Runs jobs at given time from a single task, jobs are kept in a heap ordered by fire time.
+    Jobs are coarse (e.g. "remind everybody"), per-user work is done by the job itself.
+    """
+
+    # wake up at least once a minute, so system clock changes don't postpone jobs
+    MAX_SLEEP_SECONDS = 60
+
+    def __init__(self):
+        # (fire at timestamp, sequence number, job)
+        self._jobs: List[tuple[float, int, Job]] = []
+        self._sequence = itertools.count()
+        self._changed = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._running_jobs: set[asyncio.Task] = set()
+
+    def schedule_at(self, fire_at: datetime, job: Job) -> None:
+        heapq.heappush(self._jobs, (fire_at.timestamp(), next(self._sequence), job))
+        self._changed.set()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+        for job_task in self._running_jobs:
+            job_task.cancel()
+
+    async def _run(self) -> None:
+        while True:
+            self._changed.clear()
+            delay = self._jobs[0][0] - time.time() if self._jobs else self.MAX_SLEEP_SECONDS
+
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._changed.wait(), min(delay, self.MAX_SLEEP_SECONDS))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, _, job = heapq.heappop(self._jobs)
+
+            # long jobs don't delay next ones
+            job_task = asyncio.create_task(job())
+            self._running_jobs.add(job_task)
+            job_task.add_done_callback(self._on_job_done)
+
+    def _on_job_done(self, job_task: asyncio.Task) -> None:
+        self._running_jobs.discard(job_task)
+
+        if not job_task.cancelled() and job_task.exception() is not None:
+            reminder_logger.error(f'Scheduled job failed: {job_task.exception()!r}')
+
+
+class EveningReminder:
+    """
+    Every day at REMINDER_TIME reminds users with goals, who didn't report today, to track the day.
+    Users are streamed from a single indexed query and messaged sequentially at REMINDER_RATE messages/s.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        database: DatabaseService,
+        scheduler: Scheduler,
+        remind_at: day_time | None = None,
+        rate: float | None = None
+    ):
+        self._bot = bot
+        self._database = database
+        self._scheduler = scheduler
+        self._remind_at = remind_at or day_time.fromisoformat(REMINDER_TIME)
+        self._rate = rate or float(getenv('REMINDER_RATE', 20))
+
+    def get_fire_time(self, day: date) -> datetime:
+        return kyiv_tz.localize(datetime.combine(day, self._remind_at))
+
+    def start(self) -> None:
+        now = datetime.now(kyiv_tz)
+        fire_at = self.get_fire_time(now.date())
+
+        # missed reminders (bot was restarted later) are not sent
+        if fire_at <= now:
+            fire_at = self.get_fire_time(now.date() + timedelta(days=1))
+
+        self._scheduler.schedule_at(fire_at, self.remind)
+        reminder_logger.info(f'Evening reminder is scheduled at {fire_at.isoformat()}')
+
+    async def remind(self) -> None:
+        now = datetime.now(kyiv_tz)
+        self._scheduler.schedule_at(self.get_fire_time(now.date() + timedelta(days=1)), self.remind)
+
+        day_start = kyiv_tz.localize(datetime.combine(now.date(), day_time()))
+        # job runs in its own task, replies to users go before reminders in the send queue
+        send_priority.set(SendPriority.bulk)
+        # cursor is iterated here, out of DatabaseService method
+        db_operation.set('get_not_reported_users')
+        sent_count = 0
+        interval = 1 / self._rate
+        next_send_at = time.monotonic()
+
+        async for user in self._database.get_not_reported_users(day_start):
+            # pacing: messages are spread evenly, Telegram limits bots to ~30 messages/s
+            await asyncio.sleep(max(next_send_at - time.monotonic(), 0))
+            next_send_at = max(next_send_at + interval, time.monotonic())
+
+            if await self._send_reminder(user['telegramID']):
+                sent_count += 1
+
+        reminder_logger.info(f'Evening reminder is sent to {sent_count} users')
+
+    async def _send_reminder(self, tg_id: int) -> bool:
+        for _ in range(2):
+            try:
+                await self._bot.send_message(tg_id, get_text('message-evening-reminder'), reply_markup=k_boards.main_keyboard)
+                return True
+            except TelegramRetryAfter as e:
+                await asyncio.sleep(e.retry_after)
+            except TelegramForbiddenError:
+                # user blocked the bot
+                return False
+            except TelegramAPIError as e:
+                reminder_logger.warning(f'Reminder to {tg_id} is not sent: {e}')
+                return False
+
+        return False
@@ -0,0 +1,134 @@
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime
+from os import getenv
+from typing import Awaitable, Callable, Dict, List
+
+from dotenv import load_dotenv
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from app.loggers import db_logger
+
+load_dotenv()
+
+
+@dataclass
+class PendingReport:
+    user_tg_id: int
+    created_at: datetime
+    # record in the pending reports journal, removed when the report is written
+    journal_id: ObjectId
+    # idempotent, so a batch of a failed flush can be written again
+    bucket_updates: List[UpdateOne]
+    rollup_upserts: List[UpdateOne]
+
+
+class ReportWriteBuffer:
+    """
+    Write-behind buffer of reports: they are written by `write` in batches, when `batch_size` reports
+    are pending or `flush_interval` seconds after the first pending one.
+
+    Failed batches stay in the buffer and are retried by the next flush, so `write` must be idempotent
+    (a batch can be written again in part or in full; journal replay relies on it too).
+    When `max_pending` reports are pending, adding waits for a flush; if it fails the report is added anyway,
+    it's already journaled by the caller and pending reports are retried in background.
+    The buffer is in memory only, close() must be awaited on shutdown to drain it.
+    """
+
+    def __init__(
+        self,
+        write: Callable[[List[PendingReport]], Awaitable[None]],
+        batch_size: int | None = None,
+        flush_interval: float | None = None,
+        max_pending: int | None = None,
+    ):
+        self._write = write
+        self._batch_size = batch_size or int(getenv('REPORT_BUFFER_BATCH_SIZE', 200))
+        self._flush_interval = flush_interval or float(getenv('REPORT_BUFFER_FLUSH_SECONDS', 1))
+        self._max_pending = max_pending or int(getenv('REPORT_BUFFER_MAX_PENDING', 5000))
+        self._reports: List[PendingReport] = []
+        # telegramID -> date of the latest pending report, reports aren't in the database until flushed
+        self._last_report_dates: Dict[int, datetime] = {}
+        self._lock = asyncio.Lock()
+        self._flush_task: asyncio.Task | None = None
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._reports)
+
+    def get_last_report_date(self, user_tg_id: int) -> datetime | None:
+        return self._last_report_dates.get(user_tg_id)
+
+    def get_reported_users(self, since: datetime) -> List[int]:
+        # users with pending reports created since given time
+        return [user_tg_id for user_tg_id, created_at in self._last_report_dates.items() if created_at >= since]
+
+    async def add(self, report: PendingReport) -> None:
+        if len(self._reports) >= self._max_pending:
+            db_logger.warning(f'{len(self._reports)} reports are pending, waiting for flush')
+            try:
+                await self.flush()
+            except Exception as e:
+                db_logger.error(f'Reports flush failed, {len(self._reports)} reports will be retried: {e!r}')
+
+        self._reports.append(report)
+        last_report_date = self._last_report_dates.get(report.user_tg_id)
+        if last_report_date is None or last_report_date < report.created_at:
+            self._last_report_dates[report.user_tg_id] = report.created_at
+
+        if self._flush_task is None or self._flush_task.done():
+            delay = 0 if len(self._reports) >= self._batch_size else self._flush_interval
+            self._flush_task = asyncio.create_task(self._flush_later(delay))
+        elif len(self._reports) >= self._batch_size and not self._lock.locked():
+            # batch is full before the timer
+            self._flush_task.cancel()
+            self._flush_task = asyncio.create_task(self._flush_later(0))
+
+    async def discard_user_reports(self, user_tg_id: int) -> None:
+        # reports of a deleted user must not be written after deletion, so a flush in progress is awaited
+        async with self._lock:
+            self._reports = [report for report in self._reports if report.user_tg_id != user_tg_id]
+            self._last_report_dates.pop(user_tg_id, None)
+
+    async def flush(self) -> None:
+        async with self._lock:
+            while self._reports:
+                batch = self._reports[:self._batch_size]
+                await self._write(batch)
+
+                del self._reports[:len(batch)]
+                self._forget_written(batch)
+
+    async def close(self) -> None:
+        flush_task = self._flush_task
+
+        if flush_task is not None and self._lock.locked():
+            # a batch is being written, cancelling would stop it between its writes
+            await asyncio.wait([flush_task])
+
+        if self._flush_task is not None:
+            # still sleeping (or rescheduled after a failed flush)
+            self._flush_task.cancel()
+            self._flush_task = None
+
+        await self.flush()
+
+    async def _flush_later(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+
+        try:
+            await self.flush()
+        except Exception as e:
+            db_logger.error(f'Reports flush failed, {len(self._reports)} reports will be retried: {e!r}')
+
+        if self._reports:
+            self._flush_task = asyncio.create_task(self._flush_later(self._flush_interval))
+
+    def _forget_written(self, batch: List[PendingReport]) -> None:
+        pending_users = {report.user_tg_id for report in self._reports}
+
+        for report in batch:
+            if report.user_tg_id not in pending_users:
+                self._last_report_dates.pop(report.user_tg_id, None)
@@ -0,0 +1,190 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextvars import ContextVar
+from enum import IntEnum
+from os import getenv
+from typing import Dict, List
+
+from dotenv import load_dotenv
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+
+from app.loggers import send_logger
+
+load_dotenv()
+
+CHAT_BUCKETS_CLEANUP_INTERVAL = 60
+
+
+class SendPriority(IntEnum):
+    # replies to user actions
+    interactive = 0
+    # mass sends (reminders), they get only capacity left from interactive replies
+    bulk = 1
+
+
+# priority of requests made from current task, e.g. send_priority.set(SendPriority.bulk) in a bulk job
+send_priority: ContextVar[SendPriority] = ContextVar('send_priority', default=SendPriority.interactive)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self._rate = rate
+        self._capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+
+    def get_delay(self, now: float) -> float:
+        # seconds until a token is available
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated_at) * self._rate)
+        self._updated_at = now
+
+        return 0 if self._tokens >= 1 else (1 - self._tokens) / self._rate
+
+    def take(self) -> None:
+        self._tokens -= 1
+
+    @property
+    def is_full(self) -> bool:
+        return self._tokens >= self._capacity
+
+
+class SendQueueMiddleware(BaseRequestMiddleware):
+    """
+    Bot session middleware that paces outgoing messages to Telegram limits:
+    a global token bucket (SEND_RATE messages/s) and a bucket per chat (SEND_CHAT_RATE/s, bursts of SEND_CHAT_BURST).
+
+    Only requests addressed to a chat (have chat_id) are queued, others (getUpdates, answerCallbackQuery, ...)
+    are sent immediately. Waiting requests are granted by priority (see send_priority), then in arrival order.
+    On 429 all sends are paused for retry_after and the request is queued again (up to SEND_MAX_RETRIES times).
+
+    bot.session.middleware(SendQueueMiddleware())
+    """
+
+    def __init__(
+        self,
+        rate: float | None = None,
+        chat_rate: float | None = None,
+        chat_burst: int | None = None,
+        max_retries: int | None = None,
+    ):
+        self._rate = rate or float(getenv('SEND_RATE', 30))
+        self._chat_rate = chat_rate or float(getenv('SEND_CHAT_RATE', 1))
+        self._chat_burst = chat_burst or int(getenv('SEND_CHAT_BURST', 3))
+        self._max_retries = max_retries or int(getenv('SEND_MAX_RETRIES', 3))
+
+        # no bursts globally: messages are spread evenly, so any 1s window has at most `rate` of them
+        self._bucket = TokenBucket(self._rate, 1)
+        self._chat_buckets: Dict[int | str, TokenBucket] = {}
+        self._paused_until = 0.0
+        # (priority, sequence number, chat_id, future granted when request can be sent)
+        self._waiters: List[tuple[int, int, int | str, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._changed = asyncio.Event()
+        self._grant_task: asyncio.Task | None = None
+        self._chat_buckets_cleaned_at = time.monotonic()
+
+    @property
+    def queue_size(self) -> int:
+        return len(self._waiters)
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        chat_id = getattr(method, 'chat_id', None)
+
+        if chat_id is None:
+            return await make_request(bot, method)
+
+        priority = send_priority.get()
+
+        for attempt in range(self._max_retries + 1):
+            await self._acquire(chat_id, priority)
+
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt == self._max_retries:
+                    raise
+
+                send_logger.warning(f'Flood control on {type(method).__name__}, sending is paused for {e.retry_after}s')
+                self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
+
+    async def _acquire(self, chat_id: int | str, priority: int) -> None:
+        granted = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), chat_id, granted))
+        self._changed.set()
+
+        if self._grant_task is None or self._grant_task.done():
+            self._grant_task = asyncio.create_task(self._grant())
+
+        await granted
+
+    async def _grant(self) -> None:
+        while self._waiters:
+            self._changed.clear()
+            now = time.monotonic()
+            delay = max(self._paused_until - now, self._bucket.get_delay(now))
+
+            if delay <= 0:
+                delay = self._grant_ready_waiter(now)
+
+            if delay > 0:
+                try:
+                    # new waiter can be ready earlier (another chat, higher priority)
+                    await asyncio.wait_for(self._changed.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+
+    def _grant_ready_waiter(self, now: float) -> float:
+        # grants the first waiter (by priority) whose chat isn't paced, returns delay until next try
+        not_ready = []
+        delay = 0.0
+
+        while self._waiters:
+            waiter = heapq.heappop(self._waiters)
+            _, _, chat_id, granted = waiter
+
+            if granted.done():
+                # request was cancelled while waiting
+                continue
+
+            chat_bucket = self._chat_buckets.setdefault(chat_id, TokenBucket(self._chat_rate, self._chat_burst))
+            chat_delay = chat_bucket.get_delay(now)
+
+            if chat_delay > 0:
+                not_ready.append(waiter)
+                delay = chat_delay if delay == 0 else min(delay, chat_delay)
+                continue
+
+            self._bucket.take()
+            chat_bucket.take()
+            granted.set_result(None)
+            delay = 0.0
+            break
+
+        for waiter in not_ready:
+            heapq.heappush(self._waiters, waiter)
+
+        if now - self._chat_buckets_cleaned_at > CHAT_BUCKETS_CLEANUP_INTERVAL:
+            self._forget_idle_chats(now)
+
+        return delay
+
+    def _forget_idle_chats(self, now: float) -> None:
+        # buckets refilled to a full burst are the same as new ones
+        for chat_id, bucket in list(self._chat_buckets.items()):
+            bucket.get_delay(now)
+            if bucket.is_full:
+                del self._chat_buckets[chat_id]
+
+        self._chat_buckets_cleaned_at = now
@@ -0,0 +1,81 @@
+import asyncio
+import cProfile
+import random
+from datetime import datetime
+from os import getenv
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from app.loggers import profile_logger
+
+load_dotenv()
+
+
+class UpdateProfiler:
+    """
+    Profiles a share of updates (`sample_rate`, PROFILE_SAMPLE_RATE, 0 disables) with cProfile.
+    Sampled updates slower than PROFILE_SLOW_SECONDS are dumped to PROFILE_DIR as pstats files
+    named by time, handler and FSM state; slow updates which weren't sampled are logged.
+
+    While an update is profiled cProfile sees everything the process runs (other updates, executor threads),
+    so at most one update is profiled at a time.
+
+    Dumps are read with `python -m pstats <file>` or turned into flamegraphs (flameprof, snakeviz).
+    """
+
+    def __init__(self, sample_rate: float | None = None, slow_seconds: float | None = None, directory: str | None = None):
+        self.sample_rate = sample_rate if sample_rate is not None else float(getenv('PROFILE_SAMPLE_RATE', 0))
+        self._slow_seconds = slow_seconds or float(getenv('PROFILE_SLOW_SECONDS', 1))
+        self._directory = Path(directory or getenv('PROFILE_DIR', 'profiles'))
+        self._active: cProfile.Profile | None = None
+
+    @property
+    def slow_seconds(self) -> float:
+        return self._slow_seconds
+
+    def start(self) -> cProfile.Profile | None:
+        # returns profile of the update if it's sampled
+        if self._active is not None or random.random() >= self.sample_rate:
+            return None
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # another profiler or debugger is attached
+            return None
+
+        self._active = profile
+
+        return profile
+
+    async def finish(self, profile: cProfile.Profile | None, handler_name: str, state: str | None, elapsed: float) -> None:
+        if profile is not None:
+            profile.disable()
+            self._active = None
+
+        if elapsed < self._slow_seconds:
+            return
+
+        if profile is None:
+            profile_logger.warning(f'Slow update: {handler_name} in state {state} took {elapsed:.2f}s')
+            return
+
+        path = self._directory / (
+            f'{datetime.now():%Y%m%d-%H%M%S}-{handler_name}-{(state or 'none').replace(':', '.')}'
+            f'-{elapsed * 1000:.0f}ms.pstats'
+        )
+
+        try:
+            await asyncio.to_thread(self._dump, profile, path)
+        except OSError as e:
+            profile_logger.error(f'Profile of slow update is not saved: {e}')
+            return
+
+        profile_logger.warning(f'Slow update: {handler_name} in state {state} took {elapsed:.2f}s, profile: {path}')
+
+    @staticmethod
+    def _dump(profile: cProfile.Profile, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        profile.dump_stats(path)
@@ -0,0 +1,82 @@
+import time
+from collections import OrderedDict
+from os import getenv
+from typing import Dict
+
+from dotenv import load_dotenv
+
+from app.entities.user import UserDBModel
+from app.keyboards import goals_keyboards_cache
+from app.report_plan import ReportPlan, create_report_plan
+from app.services.db_service import DatabaseService
+from app.utils import get_goals_hash
+
+load_dotenv()
+
+
+class UserCache:
+    """
+    Read-through cache of user documents keyed by telegramID.
+    Entries are dropped by DatabaseService on every user change (see subscribe_user_changes).
+    Returned documents are shared, handlers must not mutate them.
+    """
+
+    def __init__(self, database: DatabaseService, max_size: int | None = None, ttl: float | None = None):
+        self._database = database
+        self._max_size = max_size or int(getenv('USER_CACHE_SIZE', 10000))
+        self._ttl = ttl or float(getenv('USER_CACHE_TTL_SECONDS', 600))
+        # telegramID -> (user, expires at)
+        self._users: OrderedDict[int, tuple[UserDBModel, float]] = OrderedDict()
+        # telegramID -> (user document the plan is compiled from, plan)
+        self._report_plans: Dict[int, tuple[UserDBModel, ReportPlan]] = {}
+        self._invalidations = 0
+
+        database.subscribe_user_changes(self.invalidate)
+
+    async def get(self, tg_id: int) -> UserDBModel | None:
+        entry = self._users.get(tg_id)
+
+        if entry is not None and entry[1] >= time.monotonic():
+            self._users.move_to_end(tg_id)
+            return entry[0]
+
+        invalidations = self._invalidations
+        user = await self._database.get_user(tg_id)
+
+        # profile can be created later, so missing users are not cached;
+        # user could be changed while it was loading, then the loaded document can be stale
+        if user is not None and invalidations == self._invalidations:
+            self._users[tg_id] = (user, time.monotonic() + self._ttl)
+            self._users.move_to_end(tg_id)
+
+            while len(self._users) > self._max_size:
+                evicted_tg_id, _ = self._users.popitem(last=False)
+                self._report_plans.pop(evicted_tg_id, None)
+
+        return user
+
+    async def get_report_plan(self, tg_id: int) -> ReportPlan | None:
+        # compiled once per cached user document, any user change replaces the document
+        user = await self.get(tg_id)
+
+        if user is None or not user['goals']:
+            return None
+
+        entry = self._report_plans.get(tg_id)
+        if entry is not None and entry[0] is user:
+            return entry[1]
+
+        plan = create_report_plan(user['goals'])
+        if tg_id in self._users:
+            self._report_plans[tg_id] = (user, plan)
+
+        return plan
+
+    def invalidate(self, tg_id: int) -> None:
+        self._invalidations += 1
+        entry = self._users.pop(tg_id, None)
+        self._report_plans.pop(tg_id, None)
+
+        # goals keyboard of previous goals version won't be requested anymore
+        if entry is not None and entry[0]['goals']:
+            goals_keyboards_cache.invalidate(get_goals_hash(entry[0]['goals']))
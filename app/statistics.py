@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Any, Dict, TypedDict
+
+from app.text_config import get_text
+from app.rollups import is_summed_item
+
+# pandas is imported on first statistic (or by ChartService.warm_up), it's slow to import at startup
+if TYPE_CHECKING:
+    import pandas as pd
+
+WEEK_DAYS = 7
+# periods (days) available for statistic
+STATISTIC_PERIODS = (7, 30, 90, 365)
+
+# same order as items are reported
+MAIN_ITEMS_ORDER = ['diet', 'training', 'sleep']
+
+
+class StatisticRow(TypedDict):
+    key: str
+    date: str
+    title: str
+    trackedValue: int
+    goalValue: int
+
+
+class Statistic(TypedDict):
+    # item key x date (dd.MM) matrix of tracked values, 0 for days without report
+    results: 'pd.DataFrame'
+    # item key -> title, goal, sum, mean
+    summary: 'pd.DataFrame'
+
+
+def get_period_dates(now: datetime, days: int) -> list[datetime]:
+    # calendar days including today, starting at local midnight
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    return [today - timedelta(days=days_ago) for days_ago in range(days - 1, -1, -1)]
+
+
+def get_item_order(item_key: str) -> tuple[int, int]:
+    if item_key in MAIN_ITEMS_ORDER:
+        return 0, MAIN_ITEMS_ORDER.index(item_key)
+
+    # custom items: 'custom_<index>'
+    index_part = item_key.rsplit('_', 1)[-1]
+
+    return 1, int(index_part) if index_part.isdigit() else 0
+
+
+def create_statistic(rows: list[StatisticRow], dates: list[datetime]) -> Statistic:
+    import numpy as np
+    import pandas as pd
+
+    date_keys = [date.strftime('%Y-%m-%d') for date in dates]
+    date_labels = [date.strftime('%d.%m') for date in dates]
+
+    rows_frame = pd.DataFrame(rows, columns=['key', 'date', 'title', 'trackedValue', 'goalValue'])
+
+    results = (
+        rows_frame
+        .pivot_table(index='key', columns='date', values='trackedValue', aggfunc='sum')
+        .reindex(columns=date_keys)
+        .fillna(0)
+        .astype(np.int64)
+    )
+    results.columns = date_labels
+    results = results.loc[sorted(results.index, key=get_item_order)]
+
+    # goal and title of an item could be changed during the period, latest ones are used
+    latest = rows_frame.sort_values('date').groupby('key', sort=False).last()
+
+    summary = pd.DataFrame({
+        'title': latest['title'],
+        'goal': latest['goalValue'],
+        'sum': results.sum(axis=1),
+        'mean': results.mean(axis=1).round().astype(np.int64),
+    }).reindex(results.index)
+
+    return {'results': results, 'summary': summary}
+
+
+def get_reported_days_count(statistic: Statistic) -> int:
+    return int((statistic['results'] != 0).any(axis=0).sum())
+
+
+def get_statistic_lines(statistic: Statistic) -> list[Dict[str, Any]]:
+    lines = []
+
+    for _, item in statistic['summary'].iterrows():
+        if is_summed_item(item['title']):
+            result_label, result = get_text('charts-sum-result'), item['sum']
+        else:
+            result_label, result = get_text('charts-average-result'), item['mean']
+
+        lines.append({
+            'title': item['title'],
+            'goal': int(item['goal']),
+            'result_label': result_label,
+            'result': int(result),
+        })
+
+    return lines
@@ -1,10 +1,6 @@
 import enum
 from typing import TypedDict, Dict, NotRequired
 
-from app.entities.goal import GoalEntity
-from app.entities.report import TempReportObject
-from app.entities.user import UserDBModel
-
 
 class TrainingGoalType(enum.Enum):
     trainings_per_week = 'trainings-per-week'
@@ -24,12 +20,8 @@ class TrackingResultVisualizationType(enum.Enum):
 
 
 class ReportState(TypedDict):
-    user: UserDBModel
-    diet: TempReportObject
-    training: TempReportObject
-    sleep: TempReportObject
-    charts_data: Dict[str, list[int]]
-    custom_goals: NotRequired[Dict[str, GoalEntity.model]]
-    custom_goals_indexes: NotRequired[list[int]]
-    current_goal_index: NotRequired[int]
-    custom_reported_goals: NotRequired[Dict[str, TempReportObject]]
\ No newline at end of file
+    # version of report plan (goals hash) values are tracked with
+    plan_version: str
+    # in order of report plan steps
+    tracked_values: list[int]
+    charts_data: NotRequired[Dict[str, list[int]]]
\ No newline at end of file
@@ -1,56 +1,51 @@
-from typing import Any, Dict
-from io import BytesIO
-import re
+from typing import Dict, TYPE_CHECKING
+from hashlib import sha1
 import datetime
+import json
 import pytz
 
-import matplotlib.pyplot as plt
-
-from app.entities.user import UserDBModel
 from app.entities.goal import GoalEntity
 from app.entities.report import ReportEntity
 from app.text_config import get_text
-from app.types import ReportState
-
-
-def get_custom_goals(goals: Dict[str, GoalEntity.model]) -> Dict[str, GoalEntity.model]:
-    return dict(filter(lambda x: re.search('customGoal', x[0]), goals.items()))
 
+if TYPE_CHECKING:
+    from app.report_plan import ReportPlan
 
-def get_custom_goals_index_part_of_keys(goals: Dict[str, GoalEntity.model]) -> list[int]:
-    return [int(re.search(r'\d+', goal_key).group()) for goal_key in goals.keys()]
+CUSTOM_GOAL_KEY_PREFIX = 'customGoal_'
 
 
-def process_report(state: ReportState, user: UserDBModel, report: ReportEntity) -> None:
-    report_fields = ['diet', 'training', 'sleep']
+def is_custom_goal_key(goal_key: str) -> bool:
+    return goal_key.startswith(CUSTOM_GOAL_KEY_PREFIX)
 
-    main_report_fields = [[key, val] for key, val in state.items() if (lambda x: x in report_fields)(key)]
 
-    if 'custom_reported_goals' in state:
-        custom_report_fields = [[key, val] for key, val in state['custom_reported_goals'].items()]
-    else:
-        custom_report_fields = []
+def get_custom_goal_number(goal_key: str) -> int:
+    return int(goal_key.removeprefix(CUSTOM_GOAL_KEY_PREFIX))
 
-    all_report_fields = [*main_report_fields, *custom_report_fields]
 
-    for [field_name, field_object] in all_report_fields:
-        # replace 'user_goal_field' from TempReportObject to 'goal_value' for TrackedReportObject
-        field_object['goal_value'] = user['goals'][field_object['user_goal_field']]['goalValue']
-        del field_object['user_goal_field']
+def get_next_custom_goal_key(goals: Dict[str, GoalEntity.model]) -> str:
+    # numbers of deleted goals aren't reused, so the next number follows the largest one
+    custom_goal_numbers = [get_custom_goal_number(goal_key) for goal_key in goals if is_custom_goal_key(goal_key)]
 
-        report.append_field(field_name, field_object)
+    return f'{CUSTOM_GOAL_KEY_PREFIX}{max(custom_goal_numbers, default=0) + 1}'
 
 
-def create_chart_image(chart: plt) -> bytes:
-    buffer = BytesIO()
+def get_goals_hash(goals: Dict[str, GoalEntity.model]) -> str:
+    # goals order is a part of goals keyboard and report plan, so keys are not sorted
+    return sha1(json.dumps(goals, ensure_ascii=False, default=str).encode()).hexdigest()
 
-    chart.savefig(buffer, format='png', dpi=200, bbox_inches='tight')
-    buffer.seek(0)
 
-    return buffer.read()
+def process_report(plan: 'ReportPlan', tracked_values: list[int], report: ReportEntity) -> None:
+    # tracked values are collected by TrackDayState handlers in order of plan steps
+    for step, tracked_value in zip(plan.steps, tracked_values, strict=True):
+        report.append_field(step.key, {
+            'title': step.title,
+            'tracked_value': tracked_value,
+            'goal_value': step.goal_value,
+            'color': step.color,
+        })
 
 
-def out_time_tracking(last_report) -> str | None:
+def out_time_tracking(last_report_date: datetime.datetime | None) -> str | None:
     current_datetime = datetime.datetime.now().astimezone(pytz.timezone('Europe/Kyiv'))
     current_date = current_datetime.date()
     current_time = current_datetime.time()
@@ -59,68 +54,7 @@ def out_time_tracking(last_report) -> str | None:
     def check_is_evening_result() -> str | None:
         return None if current_time >= datetime.time(18, 0) else get_text('message-track-before-evening')
 
-    if last_report and last_report['createdAt'].date() == current_date:
+    if last_report_date and last_report_date.date() == current_date:
         return get_text('message-track-same-date')
     else:
         return check_is_evening_result()
-
-
-def validate_last_week_dates(raw_data: list[Dict[str, Any]]) -> int:
-    dates = map(lambda x: x['createdAt'].date(), raw_data)
-    uniq_dates = set(dates)
-
-    remaining_days = 7 - len(uniq_dates)
-
-    return remaining_days
-
-
-def prepare_statistic_data(raw_data: list[Dict[str, Any]]):
-    prepared_data = {}
-    dates = []
-    final_data = {
-        'item': [],
-        'goal': [],
-        'dates': [],
-        'results': [],
-    }
-
-    for raw_report_data in raw_data:
-        # get data as string (dd.MM) and push to all dates
-        report_created_at_string = raw_report_data['createdAt'].strftime("%d.%m")
-        dates.append(report_created_at_string)
-
-        # clear useless fields
-        del raw_report_data['createdAt']
-        del raw_report_data['_id']
-
-        for key, value in raw_report_data.items():
-            if key in prepared_data:
-                # update existing items
-                prepared_data[key]['maxGoal'] = value['goalValue']
-                prepared_data[key]['results'].append({
-                    'date': report_created_at_string,
-                    'result': value['trackedValue']
-                })
-            else:
-                # set new items
-                prepared_data[key] = {}
-                prepared_data[key]['title'] = value['title']
-                prepared_data[key]['maxGoal'] = value['goalValue']
-                prepared_data[key]['results'] = [{
-                    'date': report_created_at_string,
-                    'result': value['trackedValue']
-                }]
-
-    for data in prepared_data.values():
-        results = []
-
-        final_data['item'].append(data['title'])
-        final_data['goal'].append(data['maxGoal'])
-        final_data['dates'].append(dates)
-
-        for existing_result in data['results']:
-            results.append(existing_result.get('result') if existing_result.get('date') in dates else 0)
-
-        final_data['results'].append(results)
-
-    return final_data
\ No newline at end of file
@@ -0,0 +1,124 @@
+"""
+Webhook runtime (BOT_RUN_MODE=webhook).
+
+For local testing leave WEBHOOK_URL empty (webhook is not registered in Telegram)
+and post recorded updates to the server:
+
+curl -X POST http://localhost:8080/webhook \
+    -H 'Content-Type: application/json' \
+    -H "X-Telegram-Bot-Api-Secret-Token: $WEBHOOK_SECRET" \
+    -d @update.json
+"""
+import asyncio
+import signal
+from os import getenv
+from typing import Any, Callable, Dict
+
+from aiohttp import web
+from dotenv import load_dotenv
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+from app.loggers import webhook_logger
+
+load_dotenv()
+
+WEBHOOK_PATH = getenv('WEBHOOK_PATH', '/webhook')
+HEALTH_PATH = getenv('HEALTH_PATH', '/health')
+
+
+class ConcurrencyLimitedRequestHandler(SimpleRequestHandler):
+    """
+    Answers Telegram immediately and handles updates in background,
+    at most `max_concurrency` at once. When `max_pending` updates are already accepted
+    new ones are refused with 503, so Telegram delivers them again later.
+    """
+
+    def __init__(
+        self,
+        dispatcher: Dispatcher,
+        bot: Bot,
+        secret_token: str,
+        max_concurrency: int,
+        max_pending: int,
+        shutdown_timeout: float,
+        **data: Any
+    ) -> None:
+        super().__init__(dispatcher, bot, handle_in_background=True, secret_token=secret_token, **data)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._max_pending = max_pending
+        self._shutdown_timeout = shutdown_timeout
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if len(self._background_feed_update_tasks) >= self._max_pending:
+            webhook_logger.warning(f'{self._max_pending} updates are pending, update refused')
+            return web.Response(status=503)
+
+        return await super().handle(request)
+
+    async def _background_feed_update(self, bot: Bot, update: Dict[str, Any]) -> None:
+        async with self._semaphore:
+            await super()._background_feed_update(bot, update)
+
+    async def close(self) -> None:
+        # let accepted updates finish before dispatcher shutdown hooks.
+        # Bot session isn't closed here: shutdown hooks can still send messages, its owner closes it after them
+        if self._background_feed_update_tasks:
+            await asyncio.wait(self._background_feed_update_tasks, timeout=self._shutdown_timeout)
+
+
+async def run_webhook(
+    dispatcher: Dispatcher,
+    bot: Bot,
+    readiness_probe: Callable[[], bool] | None = None,
+    **data: Any
+) -> None:
+    secret_token = getenv('WEBHOOK_SECRET')
+    webhook_url = getenv('WEBHOOK_URL')
+
+    if not secret_token:
+        raise RuntimeError('WEBHOOK_SECRET is required in webhook mode')
+
+    app = web.Application()
+
+    handler = ConcurrencyLimitedRequestHandler(
+        dispatcher,
+        bot,
+        secret_token=secret_token,
+        max_concurrency=int(getenv('WEBHOOK_MAX_CONCURRENCY', 50)),
+        max_pending=int(getenv('WEBHOOK_MAX_PENDING', 1000)),
+        shutdown_timeout=float(getenv('WEBHOOK_SHUTDOWN_TIMEOUT', 30)),
+        **data
+    )
+    handler.register(app, path=WEBHOOK_PATH)
+    setup_application(app, dispatcher, bot=bot, **data)
+
+    if readiness_probe is not None:
+        # for load balancer / orchestrator: 503 while dependencies (database) are unavailable
+        async def handle_health(request: web.Request) -> web.Response:
+            return web.Response(status=200 if readiness_probe() else 503)
+
+        app.router.add_get(HEALTH_PATH, handle_health)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, getenv('WEBHOOK_HOST', '0.0.0.0'), int(getenv('WEBHOOK_PORT', 8080)))
+    await site.start()
+
+    if webhook_url:
+        await bot.set_webhook(f'{webhook_url}{WEBHOOK_PATH}', secret_token=secret_token)
+
+    webhook_logger.info(f'Webhook server started on {site.name}{WEBHOOK_PATH}')
+
+    # wait for termination signal, then stop accepting updates and drain accepted ones
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    try:
+        await stop_event.wait()
+    finally:
+        webhook_logger.info('Webhook server is shutting down')
+        await runner.cleanup()
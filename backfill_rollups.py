@@ -0,0 +1,18 @@
+import asyncio
+
+from app.loggers import db_logger
+from app.services.db_service import DatabaseService
+
+
+# rebuilds daily rollups from report buckets: poetry run python backfill_rollups.py
+async def main():
+    database = DatabaseService()
+    await database.connect()
+    await database.migrate()
+
+    rollups_count = await database.backfill_rollups()
+    db_logger.info(f'{rollups_count} daily rollups are rebuilt')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,56 @@
+"""
+Encode time and payload size of daily report charts for every chart profile (app/chart_profiles.py).
+Encode time includes drawing of the figure and size budget retries, as it's done by chart workers.
+
+Run from repository root: python -m benchmarks.chart_encoding_benchmark
+"""
+import time
+
+import pandas as pd
+
+from app.charts import create_chart_image, create_daily_report_charts
+from app.chart_profiles import CHART_PROFILES
+
+REPEAT = 3
+GOALS_COUNTS = range(1, 11)
+
+
+def create_charts_data(goals_count: int):
+    names = ['їжа', 'тренування', 'сон'] + [f'ціль {index}' for index in range(1, 8)]
+
+    return {
+        'name': names[:goals_count],
+        'tracked_value': [1800, 1, 8, 20, 45, 3, 0, 12, 7, 100][:goals_count],
+        'goal_value': [2000, 1, 7, 30, 30, 5, 2, 12, 10, 80][:goals_count],
+    }
+
+
+def measure(goals_count: int, profile) -> tuple[float, int]:
+    # ms per image, image size
+    timings = []
+
+    for _ in range(REPEAT):
+        fig = create_daily_report_charts(pd.DataFrame(create_charts_data(goals_count)))
+
+        started_at = time.perf_counter()
+        image_data = create_chart_image(fig, profile)
+        timings.append(time.perf_counter() - started_at)
+
+    return min(timings) * 1000, len(image_data)
+
+
+def main():
+    print(f'{"goals":<8}' + ''.join(f'{f"{name}, ms / KB":>24}' for name in CHART_PROFILES))
+
+    for goals_count in GOALS_COUNTS:
+        row = f'{goals_count:<8}'
+
+        for profile in CHART_PROFILES.values():
+            encode_ms, image_size = measure(goals_count, profile)
+            row += f'{f"{encode_ms:.0f} / {image_size / 1024:.0f}":>24}'
+
+        print(row)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Recovery of chart workers after one of them dies (killed for memory, crashed in Agg): a worker is killed,
+the first render after it must fail with ChartServiceBusyError (handlers show "charts busy" alert)
+and the next one must succeed in restarted workers. Reports time until a chart is rendered again.
+Exits with an error when the service doesn't recover.
+
+Run from repository root: python -m benchmarks.chart_worker_recovery_benchmark
+"""
+import asyncio
+import os
+import signal
+import sys
+import time
+
+from app.services.chart_service import ChartService, ChartServiceBusyError
+
+CHARTS_DATA = {
+    'name': ['їжа', 'тренування', 'сон'],
+    'tracked_value': [1800, 1, 8],
+    'goal_value': [2000, 1, 7],
+}
+
+
+async def render(chart_service: ChartService) -> bytes:
+    # straight to the workers, past the chart cache
+    return await chart_service._submit('render_daily_report_chart', CHARTS_DATA)
+
+
+async def main():
+    chart_service = ChartService(max_workers=2)
+    await chart_service.warm_up()
+    await render(chart_service)
+
+    worker_pid = next(iter(chart_service._executor._processes))
+    os.kill(worker_pid, signal.SIGKILL)
+    killed_at = time.perf_counter()
+    print(f'chart worker {worker_pid} is killed')
+
+    try:
+        await render(chart_service)
+        print('render after kill: succeeded (pool noticed the dead worker later)')
+    except ChartServiceBusyError:
+        print('render after kill: ChartServiceBusyError')
+
+    try:
+        image_data = await render(chart_service)
+    except Exception as e:
+        chart_service.shutdown()
+        sys.exit(f'chart service did not recover: {e!r}')
+
+    print(f'next render: {len(image_data)} bytes, {time.perf_counter() - killed_at:.2f}s after the kill')
+    print(f'pending jobs: {chart_service.pending_jobs}')
+
+    chart_service.shutdown()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,75 @@
+"""
+Memory of long-living chart renderers: renders many charts concurrently and reports
+peak RSS of every renderer process in the first and in the last 10% of its charts.
+RSS must stay flat, figures are not kept anywhere after rendering
+(it oscillates, rendered figures are freed by cyclic garbage collection).
+Exits with an error when the last 10% peak of any renderer is above the first 10% peak by more than --max-growth-mb.
+
+Run from repository root:
+python -m benchmarks.charts_memory_benchmark [--charts 10000] [--executor thread|process] [--max-growth-mb 20]
+"""
+import argparse
+import os
+import resource
+import sys
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from app.charts import render_daily_report_chart
+
+CHARTS_DATA = {
+    'name': ['їжа', 'тренування', 'сон', 'читання', 'прогулянка'],
+    'tracked_value': [1800, 1, 8, 20, 45],
+    'goal_value': [2000, 1, 7, 30, 30],
+}
+
+
+def get_rss_mb() -> float:
+    # current RSS on Linux, peak RSS elsewhere
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def render_job(_: int) -> tuple[int, float]:
+    render_daily_report_chart(CHARTS_DATA)
+
+    return os.getpid(), get_rss_mb()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--charts', type=int, default=10000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--executor', choices=['thread', 'process'], default='thread')
+    parser.add_argument('--max-growth-mb', type=float, default=20)
+    args = parser.parse_args()
+
+    executor: Executor = (ThreadPoolExecutor if args.executor == 'thread' else ProcessPoolExecutor)(args.workers)
+    # renderer pid -> RSS after each chart, MB
+    rss: dict[int, list[float]] = {}
+
+    with executor:
+        for rendered, (pid, rss_mb) in enumerate(executor.map(render_job, range(args.charts), chunksize=4), 1):
+            rss.setdefault(pid, []).append(rss_mb)
+
+            if rendered % 1000 == 0:
+                print(f'{rendered} charts rendered')
+
+    print(f'{"renderer pid":<16}{"charts":>8}{"first 10% peak RSS, MB":>26}{"last 10% peak RSS, MB":>26}')
+    growing = []
+    for pid, samples in rss.items():
+        part = max(len(samples) // 10, 1)
+        first_peak, last_peak = max(samples[:part]), max(samples[-part:])
+        print(f'{pid:<16}{len(samples):>8}{first_peak:>26.1f}{last_peak:>26.1f}')
+
+        if last_peak - first_peak > args.max_growth_mb:
+            growing.append(pid)
+
+    if growing:
+        sys.exit(f'RSS of renderers {", ".join(map(str, growing))} grew by more than {args.max_growth_mb:g} MB')
+
+
+if __name__ == '__main__':
+    main()
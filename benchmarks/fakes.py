@@ -0,0 +1,85 @@
+"""
+Local stand-ins for Telegram: a bot session answering Bot API methods without network and updates factories.
+"""
+import datetime
+import itertools
+from collections import Counter
+from typing import Any
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import GetMe, SendPhoto, TelegramMethod
+from aiogram.types import CallbackQuery, Chat, Message, PhotoSize, Update, User
+
+BOT_USER = User(id=42, is_bot=True, first_name='Bot')
+
+update_ids = itertools.count(1)
+
+
+class FakeSession(BaseSession):
+    def __init__(self):
+        super().__init__()
+        # method name -> requests count
+        self.requests: Counter[str] = Counter()
+        self._message_ids = itertools.count(1)
+
+    async def close(self) -> None:
+        pass
+
+    async def stream_content(self, *args: Any, **kwargs: Any):
+        yield b''
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: int | None = None) -> Any:
+        self.requests[type(method).__name__] += 1
+
+        if isinstance(method, GetMe):
+            return BOT_USER
+
+        if method.__returning__ is Message:
+            message_id = next(self._message_ids)
+            message = Message(
+                message_id=message_id,
+                date=datetime.datetime.now(),
+                chat=Chat(id=method.chat_id, type='private'),
+                from_user=BOT_USER,
+            )
+
+            if isinstance(method, SendPhoto):
+                file_id = method.photo if isinstance(method.photo, str) else f'photo-{message_id}'
+                message = message.model_copy(update={
+                    'photo': [PhotoSize(file_id=file_id, file_unique_id=file_id, width=1280, height=960)]
+                })
+
+            return message
+
+        return True
+
+
+def create_message_update(user_id: int, text: str) -> Update:
+    update_id = next(update_ids)
+
+    return Update(update_id=update_id, message=Message(
+        message_id=update_id,
+        date=datetime.datetime.now(),
+        chat=Chat(id=user_id, type='private'),
+        from_user=User(id=user_id, is_bot=False, first_name='User'),
+        text=text,
+    ))
+
+
+def create_callback_update(user_id: int, data: str) -> Update:
+    update_id = next(update_ids)
+
+    return Update(update_id=update_id, callback_query=CallbackQuery(
+        id=str(update_id),
+        chat_instance=str(user_id),
+        from_user=User(id=user_id, is_bot=False, first_name='User'),
+        data=data,
+        message=Message(
+            message_id=update_id,
+            date=datetime.datetime.now(),
+            chat=Chat(id=user_id, type='private'),
+            from_user=BOT_USER,
+            text='message with inline keyboard',
+        ),
+    ))
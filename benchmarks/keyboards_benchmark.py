@@ -0,0 +1,73 @@
+"""
+Per-call cost of goals keyboards with and without cache.
+
+Run from repository root: python -m benchmarks.keyboards_benchmark
+"""
+import timeit
+
+from app.entities.goal import GoalEntity, GoalChangeAccessType
+from app.types import TrainingGoalType
+
+import app.keyboards as k_boards
+
+ITERATIONS = 2000
+
+
+def create_goals(custom_goals_count: int):
+    goals = {
+        'dietGoal': GoalEntity({'name': 'їжа', 'value': 2000, 'change_access': GoalChangeAccessType.editable.value}).model,
+        'trainingGoalType': GoalEntity({
+            'name': 'ціль в тренуваннях',
+            'value': TrainingGoalType.trainings_per_week.value,
+            'change_access': GoalChangeAccessType.editable.value
+        }).model,
+        'trainingGoal': GoalEntity({'name': 'тренування', 'value': 3, 'change_access': GoalChangeAccessType.editable.value}).model,
+        'sleepGoal': GoalEntity({'name': 'сон', 'value': 8, 'change_access': GoalChangeAccessType.editable.value}).model,
+    }
+
+    for index in range(1, custom_goals_count + 1):
+        goals[f'customGoal_{index}'] = GoalEntity({
+            'name': f'ціль {index}',
+            'value': index * 10,
+            'change_access': GoalChangeAccessType.deletable.value
+        }).model
+
+    return goals
+
+
+def measure(func) -> float:
+    # microseconds per call
+    return min(timeit.repeat(func, number=ITERATIONS, repeat=5)) / ITERATIONS * 1_000_000
+
+
+def uncached_goals_keyboard(goals):
+    k_boards.goals_keyboards_cache.clear()
+    k_boards.create_goals_keyboard(goals)
+
+
+def uncached_training_types_keyboard():
+    k_boards.training_types_keyboards_cache.clear()
+    k_boards.create_available_training_types_keyboard(TrainingGoalType.trainings_per_week.value)
+
+
+def main():
+    print(f'{"keyboard":<32}{"before, us":>12}{"after, us":>12}')
+
+    for custom_goals_count in (0, 3, 10, 30):
+        goals = create_goals(custom_goals_count)
+
+        before = measure(lambda: uncached_goals_keyboard(goals))
+        after = measure(lambda: k_boards.create_goals_keyboard(goals))
+
+        print(f'{f"goals ({len(goals)} goals)":<32}{before:>12.1f}{after:>12.1f}')
+
+    before = measure(uncached_training_types_keyboard)
+    after = measure(lambda: k_boards.create_available_training_types_keyboard(
+        TrainingGoalType.trainings_per_week.value
+    ))
+
+    print(f'{"available training types":<32}{before:>12.1f}{after:>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+Throughput of the bot: synthetic users go through the whole dispatcher (run.create_dispatcher) concurrently:
+profile creation, /start, goals setting, day tracking (TrackDayState) and report chart.
+
+Mongo is replaced by mongomock_motor (dev dependency, installed by poetry install), Telegram by a fake bot session,
+charts are rendered by ChartService as in production. The evening-only tracking rule is disabled.
+Reports updates/s and p50/p95/p99 latency of updates and of every handler, a baseline for regressions.
+
+Run from repository root: python -m benchmarks.load_benchmark [--users 1000] [--concurrency 100]
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict
+
+from mongomock_motor import AsyncMongoMockClient
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.types import TelegramObject, Update
+
+import run
+import app.routers.main_router as main_router_module
+from app.callback_dates import (
+    AnswerTrainingDoneCallbackData,
+    SkipStepCallbackData,
+    TrackingResultOptionCallbackData,
+    TrainingTypeCallbackData,
+)
+from app.services.chart_service import ChartService
+from app.services.db_service import DatabaseService
+from app.services.user_cache import UserCache
+from app.text_config import get_text
+from app.types import SkipStepType, TrackingResultVisualizationType, TrainingGoalType
+from benchmarks.fakes import FakeSession, create_callback_update, create_message_update
+
+FIRST_USER_ID = 100_000
+
+
+class HandlerTimingMiddleware(BaseMiddleware):
+    # inner middleware: wraps only handler call, registered on dispatcher it applies to all routers
+    def __init__(self, timings: Dict[str, list[float]]):
+        self._timings = timings
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        started_at = time.perf_counter()
+
+        try:
+            return await handler(event, data)
+        finally:
+            self._timings[data['handler'].callback.__name__].append(time.perf_counter() - started_at)
+
+
+def create_user_updates(user_id: int) -> list[Update]:
+    # values are picked from small sets, as real reports often repeat (goals reached exactly)
+    return [
+        create_message_update(user_id, '/create_profile'),
+        create_message_update(user_id, '/start'),
+        create_message_update(user_id, get_text('btn-greeting-keyboard-set-goals')),
+        create_message_update(user_id, '2000'),
+        create_callback_update(user_id, TrainingTypeCallbackData(goal_type=TrainingGoalType.trainings_per_week).pack()),
+        create_message_update(user_id, '3'),
+        create_message_update(user_id, '8'),
+        create_callback_update(user_id, SkipStepCallbackData(step=SkipStepType.skip_custom_goal_setting).pack()),
+        create_message_update(user_id, get_text('btn-main-keyboard-show-user-goals')),
+        create_message_update(user_id, get_text('btn-main-keyboard-track-your-day')),
+        create_message_update(user_id, str(random.choice([1800, 2000, 2200]))),
+        create_callback_update(user_id, AnswerTrainingDoneCallbackData(answer=random.random() < 0.5).pack()),
+        create_message_update(user_id, str(random.choice([7, 8]))),
+        create_callback_update(
+            user_id,
+            TrackingResultOptionCallbackData(option_type=TrackingResultVisualizationType.charts).pack()
+        ),
+    ]
+
+
+def format_latencies(name: str, latencies: list[float]) -> str:
+    p50, p95, p99 = (statistics.quantiles(latencies, n=100)[index] * 1000 for index in (49, 94, 98))
+
+    return f'{name:<48}{len(latencies):>8}{p50:>10.1f}{p95:>10.1f}{p99:>10.1f}'
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=100)
+    args = parser.parse_args()
+
+    random.seed(1)
+    main_router_module.out_time_tracking = lambda last_report_date: None
+
+    # mongomock can't decode dates to custom timezone, they are read in UTC
+    database = DatabaseService(AsyncMongoMockClient(tz_aware=True), codec_options=None)
+    chart_service = ChartService()
+    bot = Bot('42:TOKEN', session=FakeSession())
+
+    dp = run.create_dispatcher(database)
+    dp.workflow_data.update(database=database, chart_service=chart_service, user_cache=UserCache(database))
+
+    handler_timings: Dict[str, list[float]] = defaultdict(list)
+    dp.message.middleware(HandlerTimingMiddleware(handler_timings))
+    dp.callback_query.middleware(HandlerTimingMiddleware(handler_timings))
+
+    await chart_service.warm_up()
+
+    update_timings: list[float] = []
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def run_user(user_id: int) -> None:
+        async with semaphore:
+            for update in create_user_updates(user_id):
+                started_at = time.perf_counter()
+                await dp.feed_update(bot, update)
+                update_timings.append(time.perf_counter() - started_at)
+
+    started_at = time.perf_counter()
+    try:
+        await asyncio.gather(*[run_user(FIRST_USER_ID + index) for index in range(args.users)])
+    finally:
+        chart_service.shutdown()
+    elapsed = time.perf_counter() - started_at
+
+    print(f'{args.users} users, {len(update_timings)} updates in {elapsed:.1f}s: {len(update_timings) / elapsed:.0f} updates/s')
+    print(f'Bot API requests: {dict(bot.session.requests)}')
+    print()
+    print(f'{"handler":<48}{"calls":>8}{"p50, ms":>10}{"p95, ms":>10}{"p99, ms":>10}')
+    print(format_latencies('(whole update)', update_timings))
+    for name, latencies in sorted(handler_timings.items()):
+        print(format_latencies(name, latencies))
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,64 @@
+"""
+Per-send cost of request form of a message with a constant reply markup: markup dumped and serialized
+on every send (AiohttpSession) vs serialized once (PreparedMarkupSession with STATIC_MARKUPS).
+
+Measured for every static markup: SendMessage creation (as message.answer does) plus building of request form,
+the part of a send which happens in the event loop before the request goes to network.
+
+Run from repository root: python -m benchmarks.markup_serialization_benchmark
+"""
+import asyncio
+import timeit
+
+from aiogram import Bot
+from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.enums import ParseMode
+from aiogram.methods import SendMessage
+
+import app.keyboards as k_boards
+from app.services.markup_session import PreparedMarkupSession
+
+ITERATIONS = 5000
+CHAT_ID = 100_000
+
+
+def get_markup_names() -> list[str]:
+    names = {id(value): name for name, value in vars(k_boards).items()}
+
+    return [names[id(markup)] for markup in k_boards.STATIC_MARKUPS]
+
+
+def build_form(bot: Bot, markup) -> dict[str, str]:
+    form = bot.session.build_form_data(bot, SendMessage(chat_id=CHAT_ID, text='Звіт збережено', reply_markup=markup))
+
+    return {options['name']: value for options, _, value in form._fields}
+
+
+def measure(bot: Bot, markup) -> float:
+    # microseconds per send
+    return min(timeit.repeat(lambda: build_form(bot, markup), number=ITERATIONS, repeat=5)) / ITERATIONS * 1_000_000
+
+
+async def main():
+    default = DefaultBotProperties(parse_mode=ParseMode.HTML)
+    plain_bot = Bot('42:TOKEN', session=AiohttpSession(), default=default)
+    prepared_bot = Bot('42:TOKEN', session=PreparedMarkupSession(k_boards.STATIC_MARKUPS), default=default)
+
+    print(f'{"markup":<48}{"serialized per send, us":>26}{"pre-serialized, us":>22}{"speedup":>10}')
+
+    for name, markup in zip(get_markup_names(), k_boards.STATIC_MARKUPS):
+        # both sessions must send the same request
+        assert build_form(plain_bot, markup) == build_form(prepared_bot, markup), name
+
+        plain = measure(plain_bot, markup)
+        prepared = measure(prepared_bot, markup)
+
+        print(f'{name:<48}{plain:>26.1f}{prepared:>22.1f}{plain / prepared:>9.1f}x')
+
+    await plain_bot.session.close()
+    await prepared_bot.session.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
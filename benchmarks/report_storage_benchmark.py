@@ -0,0 +1,154 @@
+"""
+Storage size and range reads of reports: one document per report (format before monthly buckets)
+vs per-user monthly buckets (app/report_buckets.py).
+
+Synthetic users report every day with 3 main and 2 custom goals. Reported: documents count, total BSON size
+of documents and p50/p95 latency of reading all reports of a user for the last 7, 30 and 90 days.
+Runs on mongomock_motor by default (dev dependency, installed by poetry install), latency is meaningful with a real
+server only: --mongo-url mongodb://localhost:27017 (database 'report-storage-benchmark' is dropped).
+
+Run from repository root: python -m benchmarks.report_storage_benchmark [--users 100] [--days 90] [--mongo-url URL]
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+import bson
+from mongomock_motor import AsyncMongoMockClient
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import ASCENDING, DESCENDING
+
+from app.entities.report import ReportEntity
+from app.report_buckets import create_bucket_updates, get_bucket_charts_data, get_bucket_month, get_report_items, kyiv_tz
+from app.services.db_migrations import REPORT_BUCKETS_INDEX
+
+DB_NAME = 'report-storage-benchmark'
+FIRST_USER_ID = 100_000
+READ_PERIODS = (7, 30, 90)
+READS_PER_PERIOD = 200
+
+GOALS = [
+    ('diet', 'Калорії', 'tab:blue', 2000),
+    ('training', 'ккал/тренування', 'tab:orange', 500),
+    ('sleep', 'Сон', 'tab:green', 8),
+    ('customGoal_1', 'Прочитати сторінок', 'tab:red', 30),
+    ('customGoal_2', 'Кроків (тисяч)', 'tab:purple', 10),
+]
+
+
+def create_report(user_id: int, created_at: datetime) -> ReportEntity:
+    report = ReportEntity(user_id)
+    report.set_created_at(created_at)
+
+    for key, title, color, goal_value in GOALS:
+        report.append_field(key, {
+            'title': title,
+            'tracked_value': random.randint(goal_value // 2, goal_value * 3 // 2),
+            'goal_value': goal_value,
+            'color': color,
+        })
+
+    return report
+
+
+async def fill(db: AsyncIOMotorDatabase, users: int, days: int) -> None:
+    await db.reports_collection.create_index([('userTelegramID', ASCENDING), ('createdAt', DESCENDING)])
+    await db.report_buckets.create_index(REPORT_BUCKETS_INDEX.keys, **REPORT_BUCKETS_INDEX.options)
+
+    first_day = datetime.now(kyiv_tz).replace(hour=20, minute=0, second=0, microsecond=0) - timedelta(days=days - 1)
+
+    for user_id in range(FIRST_USER_ID, FIRST_USER_ID + users):
+        reports = [create_report(user_id, first_day + timedelta(days=day)) for day in range(days)]
+
+        await db.reports_collection.insert_many([report.model for report in reports])
+        await db.report_buckets.bulk_write([
+            update
+            for report in reports
+            for update in create_bucket_updates(report.user_tg_id, report.date, get_report_items(report))
+        ])
+
+
+async def get_documents_size(db: AsyncIOMotorDatabase, collection: str) -> tuple[int, int]:
+    count = 0
+    size = 0
+
+    async for document in db[collection].find({}):
+        count += 1
+        size += len(bson.encode(document))
+
+    return count, size
+
+
+async def read_reports(db: AsyncIOMotorDatabase, user_id: int, days: int) -> int:
+    start = datetime.now(kyiv_tz) - timedelta(days=days)
+    reports = await db.reports_collection.find({'userTelegramID': user_id, 'createdAt': {'$gte': start}}).to_list(None)
+
+    return len(reports)
+
+
+async def read_buckets(db: AsyncIOMotorDatabase, user_id: int, days: int) -> int:
+    # as DatabaseService.get_reports_charts_data
+    start = (datetime.now(kyiv_tz) - timedelta(days=days)).date()
+    buckets = await db.report_buckets.find(
+        {'userTelegramID': user_id, 'month': {'$gte': get_bucket_month(start)}},
+        {'_id': 0, 'month': 1, 'createdAt': 1, 'items': 1}
+    ).to_list(None)
+
+    return sum(
+        get_bucket_charts_data(bucket, day) is not None
+        for bucket in buckets
+        for day in (start + timedelta(days=offset) for offset in range(days + 1))
+        if get_bucket_month(day) == bucket['month']
+    )
+
+
+async def measure_reads(db: AsyncIOMotorDatabase, read, users: int, days: int) -> tuple[float, float]:
+    latencies = []
+
+    for _ in range(READS_PER_PERIOD):
+        user_id = random.randrange(FIRST_USER_ID, FIRST_USER_ID + users)
+        started_at = time.perf_counter()
+        await read(db, user_id, days)
+        latencies.append(time.perf_counter() - started_at)
+
+    quantiles = statistics.quantiles(latencies, n=100)
+
+    return quantiles[49] * 1000, quantiles[94] * 1000
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--mongo-url')
+    args = parser.parse_args()
+
+    random.seed(1)
+    client = AsyncIOMotorClient(args.mongo_url) if args.mongo_url else AsyncMongoMockClient(tz_aware=True)
+    await client.drop_database(DB_NAME)
+    db = client[DB_NAME]
+
+    started_at = time.perf_counter()
+    await fill(db, args.users, args.days)
+    print(f'{args.users} users x {args.days} days of reports written in {time.perf_counter() - started_at:.1f}s')
+    print()
+
+    print(f'{"":<24}{"documents":>12}{"size, KB":>12}' + ''.join(f'{f"{days}d p50/p95, ms":>22}' for days in READ_PERIODS))
+
+    for name, collection, read in (
+        ('report per document', 'reports_collection', read_reports),
+        ('monthly buckets', 'report_buckets', read_buckets),
+    ):
+        count, size = await get_documents_size(db, collection)
+        reads = [await measure_reads(db, read, args.users, days) for days in READ_PERIODS]
+
+        print(f'{name:<24}{count:>12}{size / 1024:>12.0f}' + ''.join(f'{f"{p50:.2f} / {p95:.2f}":>22}' for p50, p95 in reads))
+
+    await client.drop_database(DB_NAME)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
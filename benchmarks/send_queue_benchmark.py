@@ -0,0 +1,143 @@
+"""
+Outgoing messages under burst load, sent to a local fake Bot API server with Telegram-like flood control
+(at most GLOBAL_LIMIT messages per second per bot and CHAT_LIMIT per second per chat, otherwise 429).
+
+A bulk send (reminders to BULK_CHATS users) runs together with interactive users replying to the bot.
+Reported for plain session and for session with SendQueueMiddleware: flood errors, latency of replies, bulk duration.
+
+Run from repository root: python -m benchmarks.send_queue_benchmark
+"""
+import asyncio
+import random
+import statistics
+import time
+from collections import defaultdict, deque
+
+from aiohttp import web
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.exceptions import TelegramRetryAfter
+
+from app.services.send_queue import SendQueueMiddleware, SendPriority, send_priority
+
+GLOBAL_LIMIT = 30
+CHAT_LIMIT = 4
+BULK_CHATS = 300
+INTERACTIVE_CHATS = 20
+INTERACTIVE_REPLIES = 5
+PORT = 8181
+
+
+class FakeBotApi:
+    def __init__(self):
+        self.flood_errors = 0
+        self._sent_at: deque[float] = deque()
+        self._chat_sent_at: dict[int, deque[float]] = defaultdict(deque)
+
+    @staticmethod
+    def _is_limited(sent_at: deque[float], now: float, limit: int) -> bool:
+        while sent_at and sent_at[0] <= now - 1:
+            sent_at.popleft()
+
+        return len(sent_at) >= limit
+
+    async def handle(self, request: web.Request) -> web.Response:
+        data = await request.post()
+        chat_id = int(data['chat_id'])
+        now = time.monotonic()
+
+        if self._is_limited(self._sent_at, now, GLOBAL_LIMIT) or self._is_limited(self._chat_sent_at[chat_id], now, CHAT_LIMIT):
+            self.flood_errors += 1
+            return web.json_response({
+                'ok': False,
+                'error_code': 429,
+                'description': 'Too Many Requests: retry after 1',
+                'parameters': {'retry_after': 1},
+            })
+
+        self._sent_at.append(now)
+        self._chat_sent_at[chat_id].append(now)
+
+        return web.json_response({'ok': True, 'result': {
+            'message_id': 1,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'text': data['text'],
+        }})
+
+
+async def send(bot: Bot, chat_id: int) -> bool:
+    try:
+        await bot.send_message(chat_id, 'text')
+        return True
+    except TelegramRetryAfter:
+        return False
+
+
+async def send_bulk(bot: Bot) -> tuple[float, int]:
+    send_priority.set(SendPriority.bulk)
+    started_at = time.perf_counter()
+    results = await asyncio.gather(*[send(bot, chat_id) for chat_id in range(1000, 1000 + BULK_CHATS)])
+
+    return time.perf_counter() - started_at, results.count(False)
+
+
+async def reply(bot: Bot, chat_id: int, latencies: list[float]) -> int:
+    failed = 0
+
+    for _ in range(INTERACTIVE_REPLIES):
+        await asyncio.sleep(random.uniform(0.2, 2))
+
+        started_at = time.perf_counter()
+        if await send(bot, chat_id):
+            latencies.append(time.perf_counter() - started_at)
+        else:
+            failed += 1
+
+    return failed
+
+
+async def run_scenario(with_queue: bool) -> None:
+    api = FakeBotApi()
+    app = web.Application()
+    app.router.add_post('/bot{token}/{method}', api.handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', PORT).start()
+
+    session = AiohttpSession(api=TelegramAPIServer.from_base(f'http://127.0.0.1:{PORT}'))
+    if with_queue:
+        session.middleware(SendQueueMiddleware(rate=GLOBAL_LIMIT - 2, chat_rate=1, chat_burst=CHAT_LIMIT - 1))
+    bot = Bot('42:TOKEN', session=session)
+
+    random.seed(1)
+    latencies: list[float] = []
+
+    try:
+        (bulk_seconds, bulk_failed), *interactive_failed = await asyncio.gather(
+            send_bulk(bot),
+            *[reply(bot, chat_id, latencies) for chat_id in range(INTERACTIVE_CHATS)]
+        )
+    finally:
+        await session.close()
+        await runner.cleanup()
+
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(
+        f'{"send queue" if with_queue else "plain session":<16}'
+        f'{api.flood_errors:>8}{bulk_failed + sum(interactive_failed):>8}'
+        f'{quantiles[49] * 1000:>12.0f}{quantiles[94] * 1000:>12.0f}{bulk_seconds:>10.1f}'
+    )
+
+
+async def main():
+    print(f'{"":<16}{"429s":>8}{"failed":>8}{"reply p50":>12}{"reply p95":>12}{"bulk, s":>10}')
+
+    for with_queue in (False, True):
+        await run_scenario(with_queue)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
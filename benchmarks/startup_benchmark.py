@@ -0,0 +1,102 @@
+"""
+Cold start cost: import time of the bot modules and time to the first handled update.
+
+Every measurement runs in a fresh interpreter. The first update (/start of unknown user)
+goes through the real dispatcher and routers, Telegram API calls are answered by a fake session.
+"Eager plotting" imports the plotting stack before the update, as it was imported at startup before.
+
+Run from repository root: python -m benchmarks.startup_benchmark
+"""
+import re
+import subprocess
+import sys
+import time
+
+RUNS = 3
+SLOWEST_IMPORTS = 10
+
+
+def run_python(*args: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *args],
+        capture_output=True,
+        text=True,
+        check=True,
+        env={'BOT_TOKEN': '42:TOKEN', 'PATH': ''},
+    )
+
+
+def measure_imports() -> list[tuple[str, float, int]]:
+    # -X importtime reports: self us | cumulative us | module, nested modules are indented by 2 spaces
+    stderr = run_python('-X', 'importtime', '-c', 'import run').stderr
+    imports = []
+
+    for line in stderr.splitlines():
+        match = re.match(r'import time:\s+\d+ \|\s+(\d+) \| (\s*)(\S+)', line)
+
+        if match:
+            imports.append((match.group(3), int(match.group(1)) / 1_000_000, len(match.group(2)) // 2))
+
+    return imports
+
+
+def measure_first_update(eager_plotting: bool) -> float:
+    started_at = time.time()
+    stdout = run_python('-m', 'benchmarks.startup_benchmark', 'first-update', str(started_at), str(eager_plotting))
+
+    return float(stdout.stdout.splitlines()[-1])
+
+
+# runs in a child process: imports the bot, handles one update and prints seconds since process start
+def first_update(started_at: float, eager_plotting: bool) -> None:
+    import asyncio
+    import importlib
+
+    from aiogram import Bot, Dispatcher
+
+    import run
+    from benchmarks.fakes import FakeSession, create_message_update
+
+    if eager_plotting:
+        importlib.import_module('app.charts')
+
+    class UnknownUsers:
+        async def get(self, tg_id: int) -> None:
+            return None
+
+    async def handle_update() -> None:
+        dp = Dispatcher()
+        dp.include_routers(run.chat_router, run.main_router, run.goals_setting_router, run.daily_report_setting_router)
+        bot = Bot('42:TOKEN', session=FakeSession())
+
+        await dp.feed_update(bot, create_message_update(1, '/start'), user_cache=UnknownUsers())
+
+    asyncio.run(handle_update())
+
+    print(time.time() - started_at)
+
+
+def main():
+    imports = measure_imports()
+    # modules imported by run.py itself, not their dependencies
+    run_imports = [(name, seconds) for name, seconds, depth in imports if depth == 1]
+
+    print(f'import run: {next(seconds for name, seconds, _ in imports if name == "run"):.2f}s')
+    print(f'plotting stack imported at startup: {any(name == "matplotlib" for name, _, _ in imports)}')
+    print()
+    print(f'{"slowest imports of run.py":<48}{"cumulative, s":>14}')
+    for name, seconds in sorted(run_imports, key=lambda x: x[1], reverse=True)[:SLOWEST_IMPORTS]:
+        print(f'{name:<48}{seconds:>14.3f}')
+
+    print()
+    print(f'{"time to first update":<48}{"best of " + str(RUNS) + ", s":>14}')
+    for eager_plotting in (True, False):
+        seconds = min(measure_first_update(eager_plotting) for _ in range(RUNS))
+        print(f'{"eager plotting" if eager_plotting else "lazy plotting":<48}{seconds:>14.3f}')
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['first-update']:
+        first_update(float(sys.argv[2]), sys.argv[3] == 'True')
+    else:
+        main()
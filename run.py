@@ -10,10 +10,22 @@ from aiogram import Bot, Dispatcher
 from aiogram.types import BotCommand, BotCommandScopeAllPrivateChats
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
-from aiogram.fsm.storage.mongo import MongoStorage
-
-from app.services.db_service import DatabaseService
+from aiogram.fsm.storage.memory import SimpleEventIsolation
+
+from app.services.db_service import DatabaseService, FSM_DB_NAME
+from app.services.fsm_storage import TimestampedMongoStorage, CachedStorage
+from app.middlewares import FSMWriteBackMiddleware, HandlerMetricsMiddleware, UpdateProfilingMiddleware
+from app.metrics import register_cache_metrics, start_metrics_server
+from app.webhook import run_webhook
+from app.services.chart_service import ChartService
+from app.services.user_cache import UserCache
+from app.services.update_profiler import UpdateProfiler
+from app.services.send_queue import SendQueueMiddleware
+from app.services.markup_session import PreparedMarkupSession
+from app.keyboards import STATIC_MARKUPS
+from app.services.reminder_service import Scheduler, EveningReminder, REMINDER_TIME
 from app.routers.chat_router import chat_router
+from app.routers.admin_router import admin_router
 from app.routers.goals_setting_router import goals_setting_router
 from app.routers.daily_report_setting_router import daily_report_setting_router
 from app.routers.main_router import main_router
@@ -23,29 +35,94 @@ load_dotenv()
 # Bot token can be obtained via https://t.me/BotFather
 TOKEN = getenv("BOT_TOKEN")
 
+# 'polling' or 'webhook' (see app/webhook.py)
+RUN_MODE = getenv("BOT_RUN_MODE", "polling")
+
 # All handlers should be attached to the Router (or Dispatcher)
 
 commands: List[BotCommand] = [
     BotCommand(command='/start', description='Головне меню'),
     BotCommand(command='/create_profile', description='Створити профіль'),
     BotCommand(command='/delete_profile', description='Видалити профіль'),
+    BotCommand(command='/statistic', description='Статистика за період (7, 30, 90, 365 днів)'),
 ]
 
 
+def create_dispatcher(database: DatabaseService) -> Dispatcher:
+    # events of one user are handled sequentially, so buffered FSM writes can't overwrite each other
+    dp = Dispatcher(
+        storage=CachedStorage(TimestampedMongoStorage(database.client, db_name=FSM_DB_NAME)),
+        events_isolation=SimpleEventIsolation()
+    )
+    dp.update.outer_middleware(FSMWriteBackMiddleware())
+    dp.message.middleware(HandlerMetricsMiddleware())
+    dp.callback_query.middleware(HandlerMetricsMiddleware())
+
+    # sampling is changed at runtime with admin /profile command
+    update_profiler = UpdateProfiler()
+    dp['update_profiler'] = update_profiler
+    dp.message.middleware(UpdateProfilingMiddleware(update_profiler))
+    dp.callback_query.middleware(UpdateProfilingMiddleware(update_profiler))
+
+    dp.include_routers(chat_router, admin_router, main_router, goals_setting_router, daily_report_setting_router)
+
+    return dp
+
+
 async def main() -> None:
     # Initialize Bot instance with default bot properties which will be passed to all API calls
-    bot = Bot(token=TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    bot = Bot(
+        token=TOKEN,
+        session=PreparedMarkupSession(STATIC_MARKUPS),
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML),
+    )
+    # all messages go through one rate-limited queue, replies to users before bulk sends
+    bot.session.middleware(SendQueueMiddleware())
 
     await bot.set_my_commands(commands, BotCommandScopeAllPrivateChats())
 
     database = DatabaseService()
+    await database.connect()
+    await database.migrate()
 
-    dp = Dispatcher(storage=MongoStorage(database.client, db_name='daily-report-bot-fsm'))
+    dp = create_dispatcher(database)
 
-    dp.include_routers(chat_router, main_router, goals_setting_router, daily_report_setting_router)
+    chart_service = ChartService()
+    user_cache = UserCache(database)
+
+    # services injected into handlers in both run modes
+    dp.workflow_data.update(database=database, chart_service=chart_service, user_cache=user_cache)
+
+    register_cache_metrics('fsm', dp.storage)
+    register_cache_metrics('chart', chart_service.cache)
+    start_metrics_server()
+
+    # plotting stack isn't imported at startup, it's loaded in background once updates are served
+    dp.startup.register(chart_service.start_warm_up)
+
+    dp.startup.register(database.start_health_checks)
+    dp.shutdown.register(database.stop_health_checks)
+    dp.shutdown.register(database.close)
+
+    scheduler = Scheduler()
+    dp.startup.register(scheduler.start)
+    dp.shutdown.register(scheduler.stop)
+
+    if REMINDER_TIME:
+        dp.startup.register(EveningReminder(bot, database, scheduler).start)
 
     # And the run events dispatching
-    await dp.start_polling(bot, database=database)
+    try:
+        if RUN_MODE == 'webhook':
+            await run_webhook(dp, bot, readiness_probe=lambda: database.is_ready)
+        else:
+            # polling doesn't work while webhook is set
+            await bot.delete_webhook()
+            await dp.start_polling(bot, close_bot_session=False)
+    finally:
+        chart_service.shutdown()
+        # closed after dispatcher shutdown hooks (scheduler stop, report buffer drain), they can still send messages
+        await bot.session.close()
 
 
 if __name__ == "__main__":